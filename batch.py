@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import traceback
+import contextlib
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from subtitles import enable_disk_cache
+from ft_create_content import generate_contents
+from main import PATHS, CONFIG, run_job, open_footage_store
+from ft_utils import available_cores
+
+
+def slugify(text, max_length=40):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:max_length] or "topic"
+
+def plan_jobs(topics, count, batch_dir):
+    """count jobs cycling through topics, each with its own output and log path"""
+    jobs = []
+    for n in range(count):
+        topic = topics[n % len(topics)]
+        name = f"{n:03d}-{slugify(topic)}"
+        jobs.append({
+            "job": n,
+            "topic": topic,
+            "script": None,
+            "output_path": os.path.join(batch_dir, f"{name}.mp4"),
+            "log_path": os.path.join(batch_dir, f"{name}.log"),
+        })
+    return jobs
+
+def assign_scripts(jobs, scripts_per_request):
+    """
+    Generate the scripts of all jobs up front, scripts_per_request per Claude request,
+    so the workers start directly from TTS
+    """
+    by_topic = {}
+    for job in jobs:
+        by_topic.setdefault(job["topic"], []).append(job)
+
+    for topic, topic_jobs in by_topic.items():
+        for i in range(0, len(topic_jobs), scripts_per_request):
+            chunk = topic_jobs[i:i + scripts_per_request]
+            print(f"📝 Generating {len(chunk)} scripts for: {topic}")
+            try:
+                contents = generate_contents(topic, len(chunk))
+            except Exception as e:
+                print(f"❌ Batched generation failed, these jobs will generate their own script: {str(e)}")
+                continue
+
+            for job, (video_topic, script) in zip(chunk, contents):
+                job["video_topic"] = video_topic
+                job["script"] = script
+
+def init_worker():
+    enable_disk_cache(PATHS["sprite_cache_dir"], CONFIG["sprites"]["max_bytes"])
+
+def run_batch_job(job, tmp_root):
+    """
+    Run one job in a private temporary directory, its output captured to its log file.
+    Never raises: failures are reported in the returned record.
+    """
+    record = {**job, "status": "ok", "error": None, "started": time.time()}
+    tmp_dir = tempfile.mkdtemp(prefix=f"job-{job['job']:03d}-", dir=tmp_root)
+
+    try:
+        with open(job["log_path"], "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                run_job(
+                    job["topic"],
+                    tmp_dir=tmp_dir,
+                    output_path=job["output_path"],
+                    footage_store=open_footage_store(),
+                    script=job["script"],
+                )
+            except Exception as e:
+                traceback.print_exc()
+                record["status"] = "failed"
+                record["error"] = str(e)
+
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    record["finished"] = time.time()
+    record["wall_time"] = record["finished"] - record["started"]
+    return record
+
+def summarize(records, wall_time, workers):
+    succeeded = [r for r in records if r["status"] == "ok"]
+    return {
+        "jobs": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(records) - len(succeeded),
+        "workers": workers,
+        "wall_time": wall_time,
+        "mean_job_time": sum(r["wall_time"] for r in records) / len(records) if records else 0.0,
+        "videos_per_hour": len(succeeded) / wall_time * 3600 if wall_time else 0.0,
+        "results": sorted(records, key=lambda r: r["job"]),
+    }
+
+def run_batch(topics, count, workers=None, outputs_dir=PATHS["outputs_dir"], scripts_per_request=None):
+    """
+    Generate count videos over topics in a process pool. Returns the batch summary
+
+    With scripts_per_request, scripts are generated beforehand in batched requests
+    and queued with the jobs.
+    """
+    batch_id = time.strftime("batch-%Y%m%d-%H%M%S")
+    batch_dir = os.path.join(outputs_dir, batch_id)
+    os.makedirs(batch_dir, exist_ok=True)
+    os.makedirs(PATHS["tmp_dir"], exist_ok=True)
+    tmp_root = tempfile.mkdtemp(prefix=f"{batch_id}-", dir=PATHS["tmp_dir"])
+
+    jobs = plan_jobs(topics, count, batch_dir)
+    if scripts_per_request:
+        assign_scripts(jobs, scripts_per_request)
+    workers = max(1, min(workers or available_cores(), len(jobs)))
+
+    # Download (and normalize) the footage once, before the jobs compete for it
+    footage_store = open_footage_store()
+    if CONFIG["footage"]["prefetch"] and not CONFIG["footage"]["offline"]:
+        footage_store.prefetch(pd.read_csv(PATHS["urls_csv"])["url"].tolist(), ingest=CONFIG["footage"]["mezzanine"]).join()
+
+    print(f"🚀 Running {len(jobs)} jobs on {workers} workers, outputs in {batch_dir}")
+    start = time.time()
+    records = []
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = [pool.submit(run_batch_job, job, tmp_root) for job in jobs]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                mark = "✓" if record["status"] == "ok" else "❌"
+                print(f"{mark} Job {record['job']} ({record['topic']}): {record['wall_time']:.1f}s {record['error'] or record['output_path']}")
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    summary = summarize(records, time.time() - start, workers)
+    summary_path = os.path.join(batch_dir, "summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n✨ {summary['succeeded']}/{summary['jobs']} videos in {summary['wall_time']:.1f}s "
+          f"({summary['videos_per_hour']:.1f} videos/hour), summary: {summary_path}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a batch of TikTok videos in parallel")
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of videos to generate")
+    parser.add_argument("-t", "--topic", action="append", dest="topics", help="account topic, can be repeated (jobs cycle through topics)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: available cores)")
+    parser.add_argument("-o", "--outputs-dir", default=PATHS["outputs_dir"])
+    parser.add_argument("-k", "--scripts-per-request", type=int, default=None, help="generate scripts up front, this many per request")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.topics or [CONFIG["account"]["account_topic"]],
+        args.count,
+        workers=args.workers,
+        outputs_dir=args.outputs_dir,
+        scripts_per_request=args.scripts_per_request,
+    )
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Full TikTok render time against the number of chunk workers (see ft_render.render_tiktok_chunked)
+
+One worker is the single-pass write_videofile render, the reference. Every render uses the
+same random seed, so the chunked outputs can be compared with it frame by frame: the pixel
+difference on both sides of every chunk boundary is reported along with the mean over the
+whole video (they differ only by encoding noise when overlays render identically).
+
+Usage: python benchmarks/bench_chunked_render.py [--workers 1 2 4] [--json]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures
+
+from moviepy.editor import VideoFileClip
+from ft_render import render_tiktok, seeded_random, chunk_ranges, GOP_SECONDS
+from ft_utils import available_cores
+
+
+SEED = 0
+
+def render(paths, output_path, workers, tmp_dir):
+    from main import CONFIG
+
+    captions, emojis_timestamps = fixtures.canned_captions()
+    params = {
+        "video_path": paths["gameplay"],
+        "audio_path": paths["voiceover"],
+        "music_path": paths["music"],
+        "captions": captions,
+        "emojis_timestamps": emojis_timestamps,
+        "general_config": CONFIG["general"],
+        "subtitles_config": copy.deepcopy(CONFIG["subtitles"]),
+        "output_path": output_path,
+        "tmp_dir": tmp_dir,
+    }
+
+    # Both paths build the composition under the seed render_tiktok_chunked draws
+    random.seed(SEED)
+    start = time.perf_counter()
+    if workers == 1:
+        with seeded_random(random.randrange(2**32)):
+            render_tiktok(**params)
+    else:
+        render_tiktok(**params, workers=workers)
+    return time.perf_counter() - start
+
+def frame_diffs(reference_path, output_path, workers):
+    """(mean pixel difference at the chunk boundaries, over the whole video, frame counts match)"""
+    reference = VideoFileClip(reference_path, audio=False)
+    output = VideoFileClip(output_path, audio=False)
+    fps = reference.fps
+
+    n_frames = len(np.arange(0, reference.duration, 1.0 / fps))
+    boundaries = [start for start, _ in chunk_ranges(n_frames, max(1, round(GOP_SECONDS * fps)), workers)][1:]
+    boundary_frames = sorted({i for b in boundaries for i in (b - 1, b)})
+    sampled_frames = np.linspace(0, n_frames - 1, 10).astype(int)
+
+    def diff(frames):
+        if not len(frames):
+            return 0.0
+        return float(np.mean([
+            np.abs(reference.get_frame(i / fps).astype(int) - output.get_frame(i / fps).astype(int)).mean()
+            for i in frames
+        ]))
+
+    same_length = round(reference.duration * fps) == round(output.duration * fps)
+    result = diff(boundary_frames), diff(sampled_frames), same_length
+    reference.close()
+    output.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="worker counts, default 1 to the available cores")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    worker_counts = args.workers or list(range(1, available_cores() + 1))
+    if 1 not in worker_counts:
+        worker_counts = [1] + worker_counts
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = fixtures.make_fixtures(os.path.join(tmp_dir, "fixtures"))
+        outputs = {}
+
+        for workers in sorted(worker_counts):
+            outputs[workers] = os.path.join(tmp_dir, f"tiktok_{workers}.mp4")
+            seconds = render(paths, outputs[workers], workers, tmp_dir)
+            clip = VideoFileClip(outputs[workers], audio=False)
+            frames = round(clip.duration * clip.fps)
+            clip.close()
+            results.append({"workers": workers, "seconds": seconds, "fps": frames / seconds})
+
+        for result in results:
+            result["speedup"] = results[0]["seconds"] / result["seconds"]
+            result["efficiency"] = result["speedup"] / result["workers"]
+            if result["workers"] > 1:
+                boundary, overall, same_length = frame_diffs(outputs[1], outputs[result["workers"]], result["workers"])
+                result["boundary_pixel_diff"] = boundary
+                result["mean_pixel_diff"] = overall
+                result["same_frame_count"] = same_length
+
+    if args.json:
+        print(json.dumps({"cores": available_cores(), "results": results}, indent=2))
+    else:
+        print(f"\n{'workers':>8}{'seconds':>10}{'fps':>8}{'speedup':>9}{'effic.':>8}{'bound. diff':>13}{'mean diff':>11}")
+        for result in results:
+            boundary = f"{result['boundary_pixel_diff']:.2f}" if "boundary_pixel_diff" in result else "-"
+            overall = f"{result['mean_pixel_diff']:.2f}" if "mean_pixel_diff" in result else "-"
+            print(
+                f"{result['workers']:>8}{result['seconds']:>10.1f}{result['fps']:>8.1f}"
+                f"{result['speedup']:>9.2f}{result['efficiency']:>8.2f}{boundary:>13}{overall:>11}"
+            )
+
+if __name__ == "__main__":
+    main()
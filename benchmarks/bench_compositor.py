@@ -0,0 +1,94 @@
+"""
+Frame compositing time against the number of caption overlays
+
+Captions are laid out back to back like a real video (a fixed number visible at any time),
+so the timeline grows with the caption count. moviepy's CompositeVideoClip scans every
+overlay per frame while IntervalCompositeVideoClip only visits the active ones. Besides the
+full frame time, the active-clip lookup is timed on its own since the blit of the active
+layers is the same for both.
+
+Usage: python benchmarks/bench_compositor.py [--counts 10 50 100 500] [--frames 50] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moviepy.editor import ColorClip, ImageClip, CompositeVideoClip
+from subtitles import IntervalCompositeVideoClip
+
+
+CAPTION_DURATION = 0.3
+VIDEO_SIZE = (1080, 1920)
+
+def make_overlays(count):
+    sprite = np.zeros((160, 900, 4), dtype=np.uint8)
+    sprite[..., :3] = 255
+    sprite[20:140, 20:880, 3] = 255
+
+    overlays = []
+    for i in range(count):
+        clip = ImageClip(sprite).set_start(i * CAPTION_DURATION).set_duration(CAPTION_DURATION)
+        overlays.append(clip.set_position(("center", 1100)))
+    return overlays
+
+def time_frames(composite, duration, frames):
+    """Returns (seconds per frame, seconds per active-clip lookup)"""
+    rng = random.Random(0)
+    times = [rng.uniform(0, duration) for _ in range(frames)]
+
+    start = time.perf_counter()
+    for t in times:
+        composite.get_frame(t)
+    frame_time = (time.perf_counter() - start) / frames
+
+    start = time.perf_counter()
+    for t in times:
+        composite.playing_clips(t)
+    lookup_time = (time.perf_counter() - start) / frames
+
+    return frame_time, lookup_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 50, 100, 250, 500])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.counts:
+        duration = count * CAPTION_DURATION
+        base = ColorClip(VIDEO_SIZE, color=(30, 30, 30)).set_duration(duration)
+        clips = [base] + make_overlays(count)
+
+        moviepy_frame, moviepy_lookup = time_frames(CompositeVideoClip(clips), duration, args.frames)
+        interval_frame, interval_lookup = time_frames(IntervalCompositeVideoClip(clips), duration, args.frames)
+
+        results.append({
+            "captions": count,
+            "moviepy_frame_ms": moviepy_frame * 1000,
+            "moviepy_lookup_us": moviepy_lookup * 1e6,
+            "interval_frame_ms": interval_frame * 1000,
+            "interval_lookup_us": interval_lookup * 1e6,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'captions':>8} {'moviepy ms/frame':>17} {'lookup us':>10} {'interval ms/frame':>18} {'lookup us':>10}")
+    for r in results:
+        print(
+            f"{r['captions']:>8} {r['moviepy_frame_ms']:>17.2f} {r['moviepy_lookup_us']:>10.1f}"
+            f" {r['interval_frame_ms']:>18.2f} {r['interval_lookup_us']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Per-stage benchmarks on synthetic, offline fixtures (see fixtures.py), compared to a baseline
+
+Each stage runs in a fresh process, so its peak RSS is its own and no cache is warm from a
+previous stage. Text stages (calculate_lines, create_text_ex, create_shadow) are timed over
+every caption line with the render caches cleared between repeats. Video stages report the
+frames encoded per second. The pipeline stage runs main.run_job end to end against a local
+stub_server and an offline footage library holding the gameplay fixture.
+
+Results are compared against the baseline file: a stage whose wall time or peak RSS grows by
+more than the tolerance is a regression, and the exit status is 1. The committed
+benchmarks/baseline.json was recorded on the machine described in it; timings depend on the
+hardware, so record your own with --save-baseline before comparing on another machine.
+
+Usage: python benchmarks/bench_stages.py [--stages S ...] [--repeat 20] [--baseline B]
+       [--save-baseline] [--tolerance 0.25] [--json]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import resource
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fixtures
+
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from ft_utils import available_cores
+
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+COMPARED_METRICS = ["wall_seconds", "peak_rss_mb"]
+NOISE_FLOOR = {"wall_seconds": 0.05, "peak_rss_mb": 5.0}  # smaller differences are never regressions
+
+stages = {}
+
+def stage(name):
+    def register(func):
+        stages[name] = func
+        return func
+    return register
+
+def frame_count(path):
+    infos = ffmpeg_parse_infos(path)
+    return round(infos["duration"] * infos["video_fps"])
+
+def subtitle_params():
+    from main import CONFIG
+    return {k: v for k, v in CONFIG["subtitles"].items() if k != "emojis"}
+
+def caption_lines(params):
+    """Lines of every caption, as create_subtitle_clips lays them out on a 1080 wide frame"""
+    from subtitles.subtitles import calculate_lines
+
+    lines = []
+    for segment in fixtures.SEGMENTS:
+        data = calculate_lines(segment, params["font"], params["font_size"], params["stroke_width"], 1080 - params["padding"] * 2)
+        lines.extend(line["text"] for line in data["lines"])
+    return lines
+
+@stage("calculate_lines")
+def bench_calculate_lines(paths, work_dir, repeat):
+    from subtitles import clear_caches
+    from subtitles.subtitles import calculate_lines
+
+    params = subtitle_params()
+    for _ in range(repeat):
+        clear_caches()
+        for segment in fixtures.SEGMENTS:
+            calculate_lines(segment, params["font"], params["font_size"], params["stroke_width"], 1080 - params["padding"] * 2)
+
+    return {"items": repeat * len(fixtures.SEGMENTS)}
+
+@stage("create_text_ex")
+def bench_create_text_ex(paths, work_dir, repeat):
+    from subtitles import clear_caches
+    from subtitles.text_drawer import create_text_ex
+
+    params = subtitle_params()
+    lines = caption_lines(params)
+    for _ in range(repeat):
+        clear_caches()
+        for line in lines:
+            text = create_text_ex(line, params["font_size"], params["font_color"], params["font"],
+                                  stroke_color=params["stroke_color"], stroke_width=params["stroke_width"])
+            text.get_frame(0)
+
+    return {"items": repeat * len(lines)}
+
+@stage("create_shadow")
+def bench_create_shadow(paths, work_dir, repeat):
+    from subtitles import clear_caches
+    from subtitles.subtitles import create_shadow
+
+    params = subtitle_params()
+    lines = caption_lines(params)
+    for _ in range(repeat):
+        clear_caches()
+        for line in lines:
+            create_shadow(line, params["font_size"], params["font"], params["shadow_blur"])
+
+    return {"items": repeat * len(lines)}
+
+@stage("add_animated_emojis")
+def bench_add_animated_emojis(paths, work_dir, repeat):
+    from main import CONFIG
+    from subtitles import add_animated_emojis
+
+    _, emojis_timestamps = fixtures.canned_captions()
+    output_path = os.path.join(work_dir, "emojis.mp4")
+    add_animated_emojis(paths["base_tiktok"], emojis_timestamps, output_path, **CONFIG["subtitles"]["emojis"])
+
+    return {"frames": frame_count(output_path)}
+
+@stage("write_subtitles")
+def bench_write_subtitles(paths, work_dir, repeat):
+    from subtitles import write_subtitles
+
+    captions, _ = fixtures.canned_captions()
+    output_path = os.path.join(work_dir, "subtitles.mp4")
+    write_subtitles(captions=captions, tmp_tiktok=paths["base_tiktok"], final_output=output_path, **subtitle_params())
+
+    return {"frames": frame_count(output_path)}
+
+def bench_create_tiktok(paths, work_dir, backend):
+    from main import CONFIG
+    from ft_utils import create_tiktok
+
+    output_path = os.path.join(work_dir, f"tiktok_{backend}.mp4")
+    create_tiktok(
+        paths["gameplay"],
+        paths["voiceover"],
+        paths["music"],
+        music_volume=CONFIG["general"]["music_volume"],
+        original_audio_volume=CONFIG["general"]["original_audio_volume"],
+        global_blur=CONFIG["general"]["global_blur"],
+        output_path=output_path,
+        backend=backend,
+        music_start=0.0,
+    )
+
+    return {"frames": frame_count(output_path)}
+
+@stage("create_tiktok[moviepy]")
+def bench_create_tiktok_moviepy(paths, work_dir, repeat):
+    return bench_create_tiktok(paths, work_dir, "moviepy")
+
+@stage("create_tiktok[ffmpeg]")
+def bench_create_tiktok_ffmpeg(paths, work_dir, repeat):
+    return bench_create_tiktok(paths, work_dir, "ffmpeg")
+
+@stage("pipeline")
+def bench_pipeline(paths, work_dir, repeat):
+    """main.run_job against stub_server, from topic to final video"""
+    from http.server import ThreadingHTTPServer
+    from stub_server import StubHandler
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({
+        "ANTHROPIC_BASE_URL": base_url,
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "ANTHROPIC_API_KEY": "stub",
+        "OPENAI_API_KEY": "stub",
+    })
+
+    import main
+    from ft_replay import set_replay_mode
+
+    set_replay_mode("bypass")
+    store, urls_csv = fixtures.make_footage_store(os.path.join(work_dir, "footage"), paths["gameplay"])
+
+    job_paths = dict(main.PATHS, urls_csv=urls_csv, music_path=paths["music"], outputs_dir=work_dir)
+    config = copy.deepcopy(main.CONFIG)
+    config["footage"]["offline"] = True
+
+    tmp_dir = os.path.join(work_dir, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    output_path = os.path.join(work_dir, "final_tiktok.mp4")
+    try:
+        main.run_job("Daily 'did you know' for adults", tmp_dir, output_path, footage_store=store, paths=job_paths, config=config)
+    finally:
+        server.shutdown()
+
+    return {"frames": frame_count(output_path)}
+
+def run_stage(name, paths, work_dir, repeat, verbose):
+    """Run one stage in this (fresh) process and measure it"""
+    os.chdir(ROOT)
+    if not verbose:
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+
+    work_dir = os.path.join(work_dir, name)
+    os.makedirs(work_dir, exist_ok=True)
+
+    start_times = os.times()
+    start = time.perf_counter()
+    result = stages[name](paths, work_dir, repeat)
+    wall = time.perf_counter() - start
+    end_times = os.times()
+
+    result["wall_seconds"] = wall
+    result["cpu_seconds"] = sum(end_times[:4]) - sum(start_times[:4])
+    # ru_maxrss is in kB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    result["children_peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    if "frames" in result:
+        result["fps"] = result["frames"] / wall
+    if "items" in result:
+        result["items_per_second"] = result["items"] / wall
+
+    return result
+
+def compare(results, baseline, tolerance):
+    """Stage metrics worse than the baseline by more than tolerance (a fraction) and the noise floor"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("stages", {}).get(name)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not reference.get(metric) or result.get(metric) is None:
+                continue
+            ratio = result[metric] / reference[metric]
+            if ratio > 1 + tolerance and result[metric] - reference[metric] > NOISE_FLOOR[metric]:
+                regressions.append({
+                    "stage": name,
+                    "metric": metric,
+                    "baseline": reference[metric],
+                    "value": result[metric],
+                    "ratio": ratio,
+                })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=list(stages), default=list(stages))
+    parser.add_argument("--repeat", type=int, default=20, help="repeats of the text stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth, as a fraction")
+    parser.add_argument("--verbose", action="store_true", help="show the stages' own output")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = fixtures.make_fixtures(os.path.join(tmp_dir, "fixtures"))
+
+        for name in args.stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[name] = executor.submit(run_stage, name, paths, tmp_dir, args.repeat, args.verbose).result()
+            if not args.json:
+                print(f"✓ {name}: {results[name]['wall_seconds']:.2f}s")
+
+    report = {
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": available_cores(),
+        },
+        "stages": results,
+    }
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        report["regressions"] = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+    else:
+        report["regressions"] = None
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\n{'stage':<24}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'fps':>9}{'items/s':>10}")
+        for name, result in results.items():
+            fps = f"{result['fps']:.1f}" if "fps" in result else "-"
+            items = f"{result['items_per_second']:.0f}" if "items_per_second" in result else "-"
+            print(f"{name:<24}{result['wall_seconds']:>9.2f}{result['cpu_seconds']:>9.2f}{result['peak_rss_mb']:>9.0f}{fps:>9}{items:>10}")
+
+        if report["regressions"] is None:
+            print(f"\nNo baseline at {args.baseline}, store one with --save-baseline")
+        for regression in report["regressions"] or []:
+            print(
+                f"❌ {regression['stage']} {regression['metric']}: {regression['value']:.2f} "
+                f"against {regression['baseline']:.2f} ({regression['ratio'] - 1:+.0%})"
+            )
+
+    return 1 if report["regressions"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
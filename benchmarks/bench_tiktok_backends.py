@@ -0,0 +1,92 @@
+"""
+Base TikTok render time, moviepy backend against the native ffmpeg filtergraph
+
+Inputs are synthetic (ffmpeg lavfi test pattern and tones) unless paths are given.
+
+Usage: python benchmarks/bench_tiktok_backends.py [--video V --voiceover A --music M] [--blur 0.3] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from moviepy.editor import VideoFileClip
+from ft_utils import create_tiktok
+
+
+def make_inputs(tmp_dir, duration=10, voiceover_duration=6):
+    ffmpeg = get_ffmpeg_exe()
+    video = os.path.join(tmp_dir, "gameplay.mp4")
+    voiceover = os.path.join(tmp_dir, "voiceover.mp3")
+    music = os.path.join(tmp_dir, "music.mp3")
+
+    for command in [
+        ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30", "-f", "lavfi", "-i", "sine=f=220",
+         "-t", str(duration), "-c:v", "libx264", "-c:a", "aac", video],
+        ["-f", "lavfi", "-i", "sine=f=440", "-t", str(voiceover_duration), voiceover],
+        ["-f", "lavfi", "-i", "anoisesrc=a=0.1", "-t", str(duration * 2), music],
+    ]:
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", *command], check=True)
+
+    return video, voiceover, music
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video")
+    parser.add_argument("--voiceover")
+    parser.add_argument("--music")
+    parser.add_argument("--blur", type=float, default=0.0, help="global_blur, 0-1")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.video and args.voiceover and args.music:
+            video, voiceover, music = args.video, args.voiceover, args.music
+        else:
+            video, voiceover, music = make_inputs(tmp_dir)
+
+        results = {}
+        outputs = {}
+        for backend in ["moviepy", "ffmpeg"]:
+            outputs[backend] = os.path.join(tmp_dir, f"base_{backend}.mp4")
+            start = time.perf_counter()
+            create_tiktok(
+                video, voiceover, music,
+                music_volume=0.1,
+                original_audio_volume=0.1,
+                global_blur=args.blur,
+                output_path=outputs[backend],
+                backend=backend,
+                music_start=0.0,
+            )
+            results[f"{backend}_seconds"] = time.perf_counter() - start
+
+        # Mean absolute pixel difference between the two renders, on a few frames
+        moviepy_clip = VideoFileClip(outputs["moviepy"])
+        ffmpeg_clip = VideoFileClip(outputs["ffmpeg"])
+        times = np.linspace(0, min(moviepy_clip.duration, ffmpeg_clip.duration) - 0.1, 5)
+        results["mean_pixel_diff"] = float(np.mean([
+            np.abs(moviepy_clip.get_frame(t).astype(int) - ffmpeg_clip.get_frame(t).astype(int)).mean()
+            for t in times
+        ]))
+        moviepy_clip.close()
+        ffmpeg_clip.close()
+
+    results["speedup"] = results["moviepy_seconds"] / results["ffmpeg_seconds"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key:>16}: {value:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Synthetic, offline inputs for the benchmarks
+
+Everything is generated with the bundled ffmpeg and numpy, and is deterministic: a gameplay
+test pattern, a voiceover made of noise bursts (one per word, with pauses at punctuation),
+background music, the 1080x1920 base TikTok the overlay stages draw on, and the canned
+transcription and segmentation objects the API stages would return for the voiceover.
+serve_files() serves a directory over HTTP with Range requests, as video hosts do.
+"""
+import os
+import sys
+import re
+import time
+import shutil
+import threading
+import subprocess
+
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from openai.types.audio import TranscriptionVerbose
+from ft_align import tokenize
+from ft_utils import get_segment_timestamps
+from ft_footage import FootageStore, video_id_from_url, file_sha256
+from subtitles.format_subtitles import SubtitleFormat
+
+
+SCRIPT = (
+    "Octopuses have THREE hearts! Two pump blood to the gills, one to the body. "
+    "And when they swim, the main heart stops beating. That's why they prefer crawling!"
+)
+SEGMENTS = [
+    "Octopuses have THREE hearts!",
+    "Two pump blood to the gills,",
+    "one to the body.",
+    "And when they swim,",
+    "the main heart stops beating.",
+    "That's why they prefer crawling!",
+]
+FOOTAGE_URL = "https://www.youtube.com/watch?v=benchfixture"
+SMILEYS = ["🐙", "❤️", "🩸", "🏊", "💔", "🤯"]
+
+SAMPLE_RATE = 24000
+SECONDS_PER_WEIGHT = 0.09  # spoken duration of a word per unit of ft_align.word_weight
+WORD_GAP = 0.04
+PHRASE_GAP = 0.3
+LEAD_IN = 0.2
+
+def ffmpeg(*args, input=None):
+    subprocess.run([get_ffmpeg_exe(), "-y", "-loglevel", "error", *args], input=input, check=True)
+
+def voiceover_words(script=SCRIPT):
+    """Word timings of the synthetic voiceover, as Whisper would return them"""
+    words = []
+    t = LEAD_IN
+    for word, weight, ends_phrase in tokenize(script):
+        end = t + weight * SECONDS_PER_WEIGHT
+        words.append({"word": word, "start": round(t, 3), "end": round(end, 3)})
+        t = end + (PHRASE_GAP if ends_phrase else WORD_GAP)
+    return words
+
+def voiceover_duration(script=SCRIPT):
+    return voiceover_words(script)[-1]["end"] + LEAD_IN
+
+def make_voiceover(path, script=SCRIPT):
+    """Band-limited noise bursts at the word timings of voiceover_words, encoded as mp3"""
+    rng = np.random.default_rng(0)
+    samples = np.zeros(int(voiceover_duration(script) * SAMPLE_RATE), dtype=np.float32)
+
+    for word in voiceover_words(script):
+        start, end = int(word["start"] * SAMPLE_RATE), int(word["end"] * SAMPLE_RATE)
+        t = np.arange(end - start) / SAMPLE_RATE
+        burst = np.sin(2 * np.pi * 180 * t) + 0.5 * rng.standard_normal(end - start)
+        samples[start:end] = 0.3 * burst * np.hanning(end - start)
+
+    samples += 0.002 * rng.standard_normal(len(samples)).astype(np.float32)
+    pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes()
+    ffmpeg("-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-", path, input=pcm)
+    return path
+
+def make_gameplay(path, duration=20, size="1920x1080", fps=30, gop=None):
+    """Test pattern video with a tone, a keyframe every gop frames when given"""
+    ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}",
+        "-f", "lavfi", "-i", "sine=f=220",
+        "-t", str(duration), "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        *(["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"] if gop else []),
+        "-c:a", "aac", path,
+    )
+    return path
+
+def make_music(path, duration=30):
+    ffmpeg("-f", "lavfi", "-i", "anoisesrc=a=0.1:c=pink", "-t", str(duration), path)
+    return path
+
+def make_base_tiktok(path, duration, fps=30):
+    """Vertical video with audio, the input of the subtitle and emoji overlay stages"""
+    return make_gameplay(path, duration=duration, size="1080x1920", fps=fps)
+
+def canned_transcription(script=SCRIPT):
+    """TranscriptionVerbose of the synthetic voiceover, built like the SDK response"""
+    return TranscriptionVerbose.construct(
+        text=script,
+        language="english",
+        duration=voiceover_duration(script),
+        words=voiceover_words(script),
+        segments=[],
+    )
+
+def canned_segmentation():
+    return SubtitleFormat(complete_voiceover=SCRIPT, subtitles_segments=SEGMENTS, segment_smiley=SMILEYS)
+
+def canned_captions():
+    """(captions, emojis_timestamps), as the pipeline's captions stage returns them"""
+    captions = get_segment_timestamps(canned_transcription(), canned_segmentation())
+    return captions, [(smiley, caption["start_time"]) for smiley, caption in zip(SMILEYS, captions)]
+
+def make_footage_store(root, gameplay):
+    """
+    Footage library holding only the gameplay fixture, filed under FOOTAGE_URL, and the
+    matching urls csv, for offline runs of the pipeline
+    """
+    store = FootageStore(root)
+    video_id = video_id_from_url(FOOTAGE_URL)
+    shutil.copyfile(gameplay, store.path_for(video_id))
+
+    with store.locked_index() as index:
+        index[video_id] = {
+            "url": FOOTAGE_URL,
+            "size": os.path.getsize(gameplay),
+            "sha256": file_sha256(gameplay),
+            "last_used": time.time(),
+        }
+
+    urls_csv = os.path.join(root, "urls.csv")
+    with open(urls_csv, "w") as f:
+        f.write(f"url\n{FOOTAGE_URL}\n")
+
+    return store, urls_csv
+
+def make_fixtures(root):
+    """Generate every media fixture into root. Returns their paths by name"""
+    os.makedirs(root, exist_ok=True)
+    duration = voiceover_duration()
+
+    return {
+        "gameplay": make_gameplay(os.path.join(root, "gameplay.mp4")),
+        "voiceover": make_voiceover(os.path.join(root, "voiceover.mp3")),
+        "music": make_music(os.path.join(root, "music.mp3")),
+        "base_tiktok": make_base_tiktok(os.path.join(root, "base_tiktok.mp4"), duration),
+    }
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with single byte-range support"""
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if not os.path.isfile(path) or not match:
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1)) if match.group(1) else max(0, size - int(match.group(2) or 0))
+        end = min(int(match.group(2)), size - 1) if match.group(1) and match.group(2) else size - 1
+        if start >= size:
+            self.send_error(416)
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self.range_length = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self.range_length))
+        self.end_headers()
+        return f
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "range_length", None)
+        try:
+            while remaining is None or remaining > 0:
+                chunk = source.read(64 * 1024 if remaining is None else min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg closes the connection once it has read what it needs
+
+def serve_files(root):
+    """Serve root over HTTP with Range support, in a daemon thread. Returns (server, base url)"""
+    def handler(*args, **kwargs):
+        return RangeRequestHandler(*args, directory=root, **kwargs)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
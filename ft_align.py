@@ -0,0 +1,239 @@
+"""
+Offline forced alignment of a voiceover against its known script
+
+The audio is cut into speech regions with an energy detector. Words are given a duration
+weight (estimated syllables), and the script is laid out over the speech time in proportion
+to these weights. Phrase breaks (punctuation) are then pinned to the detected pauses with a
+small dynamic program, so timing errors do not accumulate from one phrase to the next.
+
+align_audio() returns a transcription shaped like the Whisper verbose_json response:
+.text, .duration and .words[] with .word, .start and .end.
+"""
+
+import re
+import subprocess
+
+import numpy as np
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from openai.types.audio import TranscriptionVerbose
+
+
+SAMPLE_RATE = 16000
+FRAME = 0.01  # detector hop, in seconds
+WINDOW = 0.02  # detector window, in seconds
+MIN_PAUSE = 0.08  # shorter silences are treated as speech
+MIN_SPEECH = 0.03  # shorter bursts are treated as silence
+UNMATCHED_BREAK_COST = 0.4  # seconds of misplacement a phrase break without a pause costs
+
+PHRASE_END = re.compile(r"[.,!?;:…]+[\"')\]]*$")
+WORD_STRIP = ".,!?;:…\"'()[]"
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    """Mono float samples of an audio file, decoded with ffmpeg"""
+    command = [
+        get_ffmpeg_exe(), "-loglevel", "error",
+        "-i", path,
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate),
+        "-",
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"Failed to decode {path}: {result.stderr.decode(errors='replace').strip()}")
+
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768
+
+def frame_energy(samples, sample_rate=SAMPLE_RATE):
+    """RMS energy in dB of WINDOW-long windows every FRAME seconds"""
+    hop = int(sample_rate * FRAME)
+    window = int(sample_rate * WINDOW)
+    n_frames = max(1, 1 + (len(samples) - window) // hop)
+
+    padded = np.pad(samples, (0, max(0, (n_frames - 1) * hop + window - len(samples))))
+    squares = np.concatenate([[0.0], np.cumsum(padded.astype(np.float64) ** 2)])
+    starts = np.arange(n_frames) * hop
+    power = (squares[starts + window] - squares[starts]) / window
+
+    return 10 * np.log10(power + 1e-10)
+
+def fill_runs(mask, value, max_length):
+    """Flip runs of value no longer than max_length frames, except at the edges"""
+    mask = mask.copy()
+    n = len(mask)
+    i = 0
+    while i < n:
+        if mask[i] != value:
+            i += 1
+            continue
+        j = i
+        while j < n and mask[j] == value:
+            j += 1
+        if i > 0 and j < n and j - i <= max_length:
+            mask[i:j] = not value
+        i = j
+    return mask
+
+def speech_regions(samples, sample_rate=SAMPLE_RATE):
+    """(start, end) times of the speech in the audio, from an adaptive energy threshold"""
+    energy = frame_energy(samples, sample_rate)
+    floor = np.percentile(energy, 10)
+    peak = np.percentile(energy, 95)
+    threshold = floor + max(6.0, 0.3 * (peak - floor))
+
+    mask = energy > threshold
+    mask = fill_runs(mask, False, int(MIN_PAUSE / FRAME))
+    mask = fill_runs(mask, True, int(MIN_SPEECH / FRAME))
+
+    regions = []
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    for start, end in zip(edges[::2], edges[1::2]):
+        regions.append((start * FRAME, end * FRAME + WINDOW - FRAME))
+    return regions
+
+def word_weight(word):
+    """Relative spoken duration of a word: estimated syllables, digits read one by one"""
+    word = word.lower()
+    digits = sum(char.isdigit() for char in word)
+    syllables = len(re.findall(r"[aeiouy]+", word))
+    if word.endswith("e") and syllables > 1 and not word.endswith(("le", "ee")):
+        syllables -= 1
+    return max(1, syllables) + digits + 0.5
+
+def tokenize(script):
+    """(word, weight, ends_phrase) for every spoken word of the script"""
+    tokens = []
+    for raw in script.split():
+        word = raw.strip(WORD_STRIP)
+        if not word.strip("-–—"):
+            if tokens and raw.strip() in "-–—":
+                tokens[-1] = (tokens[-1][0], tokens[-1][1], True)
+            continue
+        tokens.append((word, word_weight(word), bool(PHRASE_END.search(raw))))
+    return tokens
+
+class SpeechTimeline:
+    """Maps speech time (seconds of speech only, pauses removed) to clock time and back"""
+    def __init__(self, regions):
+        self.regions = regions
+        self.offsets = np.concatenate([[0.0], np.cumsum([end - start for start, end in regions])])
+        self.total = self.offsets[-1]
+
+    def to_clock(self, speech_time):
+        speech_time = min(max(speech_time, 0.0), self.total)
+        i = min(int(np.searchsorted(self.offsets, speech_time, side="right")) - 1, len(self.regions) - 1)
+        return self.regions[i][0] + speech_time - self.offsets[i]
+
+    def to_speech(self, clock_time):
+        for (start, end), offset in zip(self.regions, self.offsets):
+            if clock_time < start:
+                return offset
+            if clock_time <= end:
+                return offset + clock_time - start
+        return self.total
+
+def clip_regions(regions, start, end):
+    clipped = [(max(s, start), min(e, end)) for s, e in regions if e > start and s < end]
+    return clipped or [(start, end)]
+
+def match_breaks(expected, gaps):
+    """
+    Monotone assignment of phrase breaks to pauses, minimizing the distance between the
+    expected break time and the pause, both in speech time
+
+    Returns:
+        for each break, the index of its pause or None
+    """
+    n, m = len(expected), len(gaps)
+    cost = np.full((n + 1, m + 1), np.inf)
+    choice = np.zeros((n + 1, m + 1), dtype=np.int8)
+    cost[0, :] = 0.0
+
+    for i in range(1, n + 1):
+        cost[i, 0] = cost[i - 1, 0] + UNMATCHED_BREAK_COST
+        for j in range(1, m + 1):
+            options = (
+                cost[i, j - 1],  # pause j left unused
+                cost[i - 1, j] + UNMATCHED_BREAK_COST,  # break i without a pause
+                cost[i - 1, j - 1] + abs(expected[i - 1] - gaps[j - 1]),  # break i on pause j
+            )
+            best = min(range(3), key=options.__getitem__)
+            choice[i, j] = best
+            cost[i, j] = options[best]
+
+    assignment = [None] * n
+    i, j = n, m
+    while i > 0:
+        if j == 0 or choice[i, j] == 1:
+            i -= 1
+        elif choice[i, j] == 0:
+            j -= 1
+        else:
+            assignment[i - 1] = j - 1
+            i, j = i - 1, j - 1
+    return assignment
+
+def align_tokens(tokens, regions):
+    """Start and end time of every token over the speech regions"""
+    if not tokens:
+        return []
+
+    timeline = SpeechTimeline(regions)
+    weights = np.array([weight for _, weight, _ in tokens])
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)]) / weights.sum() * timeline.total
+
+    # Pin phrase breaks to pauses
+    pauses = [(regions[i][1], regions[i + 1][0]) for i in range(len(regions) - 1)]
+    breaks = [k for k, (_, _, ends_phrase) in enumerate(tokens[:-1]) if ends_phrase]
+    assignment = match_breaks(
+        [cumulative[k + 1] for k in breaks],
+        [timeline.to_speech(start) for start, _ in pauses],
+    )
+
+    # (first token of a group, end of the previous group, start of this group)
+    cuts = [(0, regions[0][0], regions[0][0])]
+    for k, pause in zip(breaks, assignment):
+        if pause is not None:
+            cuts.append((k + 1, *pauses[pause]))
+    cuts.append((len(tokens), regions[-1][1], regions[-1][1]))
+
+    # Spread the words of each group over the speech between its pauses
+    times = []
+    for (first, _, start), (last, end, _) in zip(cuts[:-1], cuts[1:]):
+        group = SpeechTimeline(clip_regions(regions, start, end))
+        group_weights = np.concatenate([[0.0], np.cumsum(weights[first:last])])
+        group_weights = group_weights / group_weights[-1] * group.total
+
+        for n in range(last - first):
+            times.append((group.to_clock(group_weights[n]), group.to_clock(group_weights[n + 1])))
+
+    return times
+
+def align_audio(audio_path, script):
+    """
+    Word timings of a known script in its voiceover, computed locally
+
+    Returns:
+        TranscriptionVerbose, like transcribe_audio
+    """
+    try:
+        samples = load_audio(audio_path)
+    except Exception as e:
+        raise Exception(f"Failed to align audio: {str(e)}")
+
+    duration = len(samples) / SAMPLE_RATE
+    regions = speech_regions(samples) or [(0.0, duration)]
+    tokens = tokenize(script)
+
+    words = [
+        {"word": word, "start": round(float(start), 3), "end": round(float(end), 3)}
+        for (word, _, _), (start, end) in zip(tokens, align_tokens(tokens, regions))
+    ]
+
+    # Built like SDK responses, unvalidated (the SDK types duration as a string)
+    return TranscriptionVerbose.construct(
+        text=script,
+        language="english",
+        duration=duration,
+        words=words,
+        segments=[],
+    )
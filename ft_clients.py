@@ -0,0 +1,60 @@
+"""
+Long-lived API clients shared by every stage and job of a process
+
+Each client keeps a pool of keep-alive connections, so consecutive requests skip the TCP
+and TLS setup. Clients are created on first use and dropped in forked children, which
+must not share their parent's connections.
+"""
+
+import os
+import threading
+
+import httpx
+import anthropic
+
+from openai import OpenAI, DefaultHttpxClient as OpenAIHttpxClient
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+clients = {}
+clients_lock = threading.Lock()
+
+def connection_limits():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+
+def get_client(name, factory):
+    if name not in clients:
+        with clients_lock:
+            if name not in clients:
+                clients[name] = factory()
+    return clients[name]
+
+def get_anthropic_client():
+    return get_client("anthropic", lambda: anthropic.Anthropic(
+        api_key=os.getenv("ANTHROPIC_API_KEY"),
+        timeout=TIMEOUT,
+        http_client=anthropic.DefaultHttpxClient(limits=connection_limits(), timeout=TIMEOUT),
+    ))
+
+def get_openai_client():
+    return get_client("openai", lambda: OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=TIMEOUT,
+        http_client=OpenAIHttpxClient(limits=connection_limits(), timeout=TIMEOUT),
+    ))
+
+def reset_clients():
+    """Forget every client, without closing connections that may belong to a parent process"""
+    global clients_lock
+
+    clients.clear()
+    clients_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_clients)
@@ -1,18 +1,54 @@
 import os
-import anthropic
 
-from openai import OpenAI
 from dotenv import load_dotenv
+from ft_replay import cached_call
+from ft_clients import get_anthropic_client, get_openai_client
 
 
 load_dotenv()
 
-def generate_content(account_topic):
-   client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+MODEL = "claude-3-5-sonnet-20241022"
 
+SCRIPT_GUIDELINES = """Remember this is for TikTok - you need to:
+                        - Hook viewers in first 3 seconds
+                        - Use short, punchy sentences
+                        - Keep energy high and dynamic
+                        - Use conversational language
+                        - Build curiosity and suspense
+                        - Never drag or over-explain
+                        - Maintain fast pacing
+                        - No emojis or hashtags (it's a voiceover)"""
+
+SCRIPTS_TOOL = {
+    "name": "tiktok_scripts",
+    "description": "Record the topics and voice-over scripts of several TikTok videos",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "videos": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "topic": {"type": "string", "description": "The topic of the video"},
+                        "script": {"type": "string", "description": "The voice-over script, 30 words max"},
+                    },
+                    "required": ["topic", "script"],
+                },
+            },
+        },
+        "required": ["videos"],
+    },
+}
+
+def create_message(**params):
+   """Text of a Claude message, through the replay cache"""
+   return cached_call("anthropic_messages", params, lambda: get_anthropic_client().messages.create(**params).content[0].text)
+
+def generate_content(account_topic):
    # Generate topic
-   topic = client.messages.create(
-       model="claude-3-5-sonnet-20241022",
+   topic = create_message(
+       model=MODEL,
        max_tokens=1024,
        messages=[{
            "role": "user",
@@ -24,8 +60,8 @@ def generate_content(account_topic):
    )
 
    # Generate script
-   script = client.messages.create(
-       model="claude-3-5-sonnet-20241022",
+   script = create_message(
+       model=MODEL,
        max_tokens=1024,
        messages=[{
            "role": "user",
@@ -33,42 +69,66 @@ def generate_content(account_topic):
                         The TikTok account for which you generate text has the following theme:
                         << {account_topic} >>
                         Write the voice-over script from the following topic:
-                        {topic.content[0].text}
-                        Remember this is for TikTok - you need to:
-                        - Hook viewers in first 3 seconds
-                        - Use short, punchy sentences
-                        - Keep energy high and dynamic
-                        - Use conversational language
-                        - Build curiosity and suspense
-                        - Never drag or over-explain
-                        - Maintain fast pacing
-                        - No emojis or hashtags (it's a voiceover)
+                        {topic}
+                        {SCRIPT_GUIDELINES}
                         Give only the script, without introduction.
                         Short Script (30 words max):
                         """
        }]
    )
 
-   return script.content[0].text
+   return script
 
-def create_tts(text, voice="fable", output_path='output.mp3'):
-    """Create Text-to-Speech using OpenAI's API"""
-    try:
-        # Initialize OpenAI client
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def generate_contents(account_topic, count):
+   """
+   count (topic, script) pairs for the account in one structured request, instead of
+   two requests per video
+   """
+   params = {
+       "model": MODEL,
+       "max_tokens": 256 + 128 * count,
+       "tools": [SCRIPTS_TOOL],
+       "tool_choice": {"type": "tool", "name": SCRIPTS_TOOL["name"]},
+       "messages": [{
+           "role": "user",
+           "content": f"""You are a topic and script writer for TikTok videos.
+                        The TikTok account has the following theme:
+                        << {account_topic} >>
+                        Write {count} different videos: for each one, a topic and the voice-over script on that topic.
+                        Every topic must be different from the others.
+                        {SCRIPT_GUIDELINES}
+                        Each script is only the voice-over, without introduction, 30 words max.
+                        """
+       }],
+   }
+
+   def request():
+       message = get_anthropic_client().messages.create(**params)
+       return next(block.input for block in message.content if block.type == "tool_use")["videos"]
+
+   videos = cached_call("anthropic_scripts", params, request)
+   if len(videos) < count:
+       print(f"NOTICE: asked for {count} scripts, got {len(videos)}")
+
+   return [(video["topic"], video["script"]) for video in videos[:count]]
 
+def create_tts(text, voice="fable", output_path='output.mp3', tmp_dir="./tmp"):
+    """Create Text-to-Speech using OpenAI's API, saved as output_path in tmp_dir"""
+    try:
         # Get full path in tmp directory
-        tmp_path = os.path.join("./tmp", output_path)
+        tmp_path = os.path.join(tmp_dir, output_path)
 
         # Generate speech
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
+        request = {"model": "tts-1", "voice": voice, "input": text}
+
+        def speak():
+            return get_openai_client().audio.speech.create(**request).content
+
+        audio = cached_call("openai_speech", request, speak, binary=True)
 
         # Save to file
-        response.stream_to_file(tmp_path)
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
 
     except Exception as e:
         print(f"Error generating TTS: {str(e)}")
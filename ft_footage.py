@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+
+import yt_dlp
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from ft_utils import cover_crop_filters, download_footage_range, footage_format, read_packets
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+
+def video_id_from_url(url):
+    """YouTube video id when it can be read from the URL, else a hash of the URL"""
+    parsed = urlparse(url)
+
+    if parsed.hostname and "youtube" in parsed.hostname:
+        video_id = parse_qs(parsed.query).get("v", [None])[0]
+        if video_id:
+            return video_id
+
+    if parsed.hostname == "youtu.be" and parsed.path.strip("/"):
+        return parsed.path.strip("/")
+
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def probe_keyframes(path):
+    """Presentation times of the video keyframes of a file, read from its packet flags"""
+    packets, _, _ = read_packets(path)
+    return sorted(packet["time"] for packet in packets if packet["key"])
+
+class FootageStore:
+    """
+    Local library of downloaded gameplay videos, keyed by video id
+
+    Files live in root/<video_id>.mp4 and are described in root/index.json (url, size, sha256,
+    last use). The library is capped at max_bytes, least recently used videos are evicted
+    first. The index is updated under a file lock so several processes can share a store.
+
+    ingest() transcodes a source once into a vertical 1080x1920 mezzanine root/<video_id>.mezz.mp4
+    with a keyframe every keyframe_interval seconds, recorded in the index with its duration
+    and keyframe times, so renders can seek to a random keyframe and decode a short segment
+    that needs no resize.
+
+    Downloads are capped at max_height (and max_tbr kbit/s when set). With max_seconds, only a
+    random max_seconds window of each video is downloaded and cached; a window shorter than a
+    duration asked for (e.g. by segment_start) is downloaded again, lasting the duration plus
+    range_margin. Windows are kept long so segments of the same video vary from job to job.
+    """
+    def __init__(self, root="./footage", max_bytes=20 * 1024**3, ydl_opts=None, keyframe_interval=1.0,
+                 max_seconds=None, max_height=1080, max_tbr=None, range_margin=2.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.max_seconds = max_seconds
+        self.max_height = max_height
+        self.max_tbr = max_tbr
+        self.range_margin = range_margin
+        self.ydl_opts = ydl_opts or {}
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.RLock()
+        self.prefetcher = None
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def locked_index(self):
+        """Read the index under an exclusive lock, the yielded dict is written back on exit"""
+        with self.lock, open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = self.read_index()
+                yield index
+                self.write_index(index)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def path_for(self, video_id):
+        return os.path.join(self.root, f"{video_id}.mp4")
+
+    def mezzanine_path_for(self, video_id):
+        return os.path.join(self.root, f"{video_id}.mezz.mp4")
+
+    def cached_ids(self):
+        return list(self.read_index().keys())
+
+    def verify(self, video_id, full=False, duration=None):
+        """
+        Check a cached video against its recorded size, and its sha256 when full is set.
+        With a duration, a cached window must also last that long.
+        """
+        entry = self.read_index().get(video_id)
+        path = self.path_for(video_id)
+
+        if entry is None or not os.path.exists(path):
+            return False
+        if duration and "range" in entry and entry["range"][1] - entry["range"][0] < duration:
+            return False
+        if os.path.getsize(path) != entry["size"]:
+            return False
+        if full and file_sha256(path) != entry["sha256"]:
+            return False
+        return True
+
+    def download(self, url, duration=None):
+        """
+        Download a video into the store, if missing, corrupt or too short for duration
+        seconds: the whole video, or a window of it (see the class docstring). Returns its path
+        """
+        video_id = video_id_from_url(url)
+        path = self.path_for(video_id)
+
+        if self.verify(video_id, duration=duration):
+            return path
+
+        seconds = self.max_seconds
+        if seconds and duration and seconds < duration + self.range_margin:
+            seconds = duration + self.range_margin
+
+        tmp_dir = tempfile.mkdtemp(dir=self.root)
+        try:
+            tmp_path = os.path.join(tmp_dir, "video.mp4")
+            entry = {"url": url}
+
+            if seconds:
+                stats = download_footage_range(
+                    url,
+                    tmp_path,
+                    seconds,
+                    margin=0.0,
+                    max_height=self.max_height,
+                    max_tbr=self.max_tbr,
+                    ydl_opts=self.ydl_opts,
+                )
+                entry["range"] = [stats["start"], stats["end"]]
+                entry["source_bytes"] = stats["source_bytes"]
+
+            else:
+                ydl_opts = {
+                    'format': footage_format(self.max_height, self.max_tbr),
+                    'outtmpl': tmp_path,
+                    'quiet': True,
+                    'no_warnings': True,
+                    'noprogress': True,
+                    **self.ydl_opts,
+                }
+
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    print(f"Downloading video from: {url}")
+                    ydl.download([url])
+
+            entry.update({
+                "size": os.path.getsize(tmp_path),
+                "sha256": file_sha256(tmp_path),
+                "last_used": time.time(),
+            })
+            os.replace(tmp_path, path)
+
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with self.locked_index() as index:
+            index[video_id] = entry
+            self.evict(index, keep=video_id)
+
+        return path
+
+    def evict(self, index, keep=None):
+        """Drop least recently used videos, and their mezzanine, until the library fits in max_bytes"""
+        def entry_size(entry):
+            return entry["size"] + entry.get("mezzanine", {}).get("size", 0)
+
+        total = sum(entry_size(entry) for entry in index.values())
+
+        for video_id in sorted(index, key=lambda v: index[v]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if video_id == keep:
+                continue
+
+            total -= entry_size(index[video_id])
+            del index[video_id]
+            for path in [self.path_for(video_id), self.mezzanine_path_for(video_id)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def ingest(self, video_id):
+        """Transcode a cached source into its 1080x1920 mezzanine, once. Returns the mezzanine entry"""
+        entry = self.read_index().get(video_id)
+        if entry is None:
+            raise Exception(f"Video {video_id} is not in the footage store")
+
+        mezzanine = entry.get("mezzanine")
+        if mezzanine and os.path.exists(self.mezzanine_path_for(video_id)) \
+                and os.path.getsize(self.mezzanine_path_for(video_id)) == mezzanine["size"]:
+            return mezzanine
+
+        source_infos = ffmpeg_parse_infos(self.path_for(video_id))
+        fps = source_infos["video_fps"]
+        gop = max(1, round(fps * self.keyframe_interval))
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".mp4")
+        os.close(fd)
+        command = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-i", self.path_for(video_id),
+            "-vf", ",".join(cover_crop_filters(source_infos["video_size"])),
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-force_key_frames", f"expr:gte(t,n_forced*{self.keyframe_interval})",
+            "-c:a", "aac",
+            "-movflags", "+faststart",
+            tmp_path,
+        ]
+
+        print(f"Ingesting footage {video_id}...")
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            os.remove(tmp_path)
+            raise Exception(f"Failed to ingest footage {video_id}: {result.stderr.strip()}")
+
+        duration = ffmpeg_parse_infos(tmp_path)["duration"]
+        mezzanine = {
+            "size": os.path.getsize(tmp_path),
+            "duration": duration,
+            "fps": fps,
+            "keyframes": [round(t, 3) for t in probe_keyframes(tmp_path) if t < duration],
+        }
+        os.replace(tmp_path, self.mezzanine_path_for(video_id))
+
+        with self.locked_index() as index:
+            if video_id in index:
+                index[video_id]["mezzanine"] = mezzanine
+                self.evict(index, keep=video_id)
+
+        return mezzanine
+
+    def pick_segment(self, urls, duration, offline=False):
+        """
+        Random segment of at least duration seconds from the mezzanine library
+
+        Returns:
+            (mezzanine path, start time), the start being a keyframe
+        """
+        video_id = self.pick_mezzanine(urls, offline=offline, duration=duration)
+        return self.mezzanine_path_for(video_id), self.segment_start(video_id, duration)
+
+    def pick_mezzanine(self, urls, offline=False, duration=None):
+        """Random video among urls, as pick(), ingested. Returns its video id"""
+        path = self.pick(urls, offline=offline, duration=duration)
+        video_id = os.path.basename(path)[:-len(".mp4")]
+        self.ingest(video_id)
+        return video_id
+
+    def segment_start(self, video_id, duration, offline=False):
+        """
+        Random keyframe of an ingested video leaving at least duration seconds after it.
+        A cached window too short for duration is downloaded again, longer, unless offline.
+        """
+        mezzanine = self.ingest(video_id)
+        entry = self.read_index().get(video_id, {})
+        if mezzanine["duration"] < duration and "range" in entry and not offline:
+            self.download(entry["url"], duration=duration)
+            mezzanine = self.ingest(video_id)
+
+        starts = [t for t in mezzanine["keyframes"] if t + duration <= mezzanine["duration"]]
+        return random.choice(starts) if starts else 0.0
+
+    def touch(self, video_id):
+        with self.locked_index() as index:
+            if video_id in index:
+                index[video_id]["last_used"] = time.time()
+
+    def get(self, url, offline=False, duration=None):
+        """
+        Path of the video for url, lasting at least duration seconds when given, downloading it
+        unless offline. Returns None when unavailable offline
+        """
+        video_id = video_id_from_url(url)
+
+        if self.verify(video_id, duration=duration):
+            self.touch(video_id)
+            return self.path_for(video_id)
+
+        if offline:
+            return None
+
+        path = self.download(url, duration=duration)
+        self.touch(video_id)
+        return path
+
+    def pick(self, urls, offline=False, duration=None):
+        """
+        Random video among urls, lasting at least duration seconds when given: a cached one
+        when possible, else a fresh download. In offline mode only cached videos are considered.
+        """
+        cached = [url for url in urls if self.verify(video_id_from_url(url), duration=duration)]
+
+        if cached:
+            return self.get(random.choice(cached), duration=duration)
+
+        if offline:
+            raise Exception("No cached footage available in offline mode")
+
+        return self.get(random.choice(urls), duration=duration)
+
+    def prefetch(self, urls, ingest=False):
+        """Download every missing url, and transcode its mezzanine if ingest is set, in a background daemon thread"""
+        def run():
+            for url in urls:
+                try:
+                    self.download(url)
+                    if ingest:
+                        self.ingest(video_id_from_url(url))
+                except Exception as e:
+                    print(f"❌ Prefetch failed for {url}: {str(e)}")
+
+        if self.prefetcher is None or not self.prefetcher.is_alive():
+            self.prefetcher = threading.Thread(target=run, name="footage-prefetch", daemon=True)
+            self.prefetcher.start()
+
+        return self.prefetcher
@@ -0,0 +1,340 @@
+"""
+Run instrumentation: stage timings, render throughput, I/O, cache and memory stats
+
+A RunMetrics records one job. Pipeline stages are measured by wrapping their call (see
+Pipeline's metrics argument), renders count their frames through the proglog logger of
+render_logger(), which write_videofile accepts. Each run is written as a JSON report, and
+serve_metrics() publishes the current run on a local HTTP endpoint.
+
+CPU time and bytes read/written are those of the stage's worker thread and of the helper
+threads it hands work to through thread_usage() (the decode and compositor threads of
+ft_streaming). Bytes come from /proc/thread-self/io, so Linux only: every read() and write()
+call, files, pipes and sockets alike. Subprocesses such as ffmpeg are counted in
+children_cpu_seconds, which is process-wide and shared by stages running at the same time.
+"""
+
+import os
+import json
+import time
+import resource
+import threading
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from proglog import TqdmProgressBarLogger
+
+
+PREFIX = "ft"
+
+active_run = None
+last_report = None
+stage_context = threading.local()
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory"""
+    scale = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024  # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def io_counters(path="/proc/thread-self/io"):
+    """(bytes read, bytes written) by the calling thread, or None where /proc is unavailable"""
+    try:
+        with open(path) as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def cache_snapshot():
+    # Imported here: the subtitles package imports this module for render_logger
+    from subtitles.cache import cache_stats
+    return {name: (stats["hits"], stats["misses"]) for name, stats in cache_stats().items()}
+
+class FrameMeter(TqdmProgressBarLogger):
+    """moviepy progress logger that also records how many frames a render wrote, and how fast"""
+    def __init__(self, record):
+        super().__init__()
+        self.record = record
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == "t" and attr == "index":
+            now = time.perf_counter()
+            if self.record["started"] is None:
+                self.record["started"] = now
+                self.record["total"] = self.bars[bar]["total"]
+            # The bar's last callback is at index == total, once the last frame is written
+            total = self.record["total"]
+            self.record["frames"] = min(value + 1, total) if total else value + 1
+            self.record["elapsed"] = now - self.record["started"]
+        super().bars_callback(bar, attr, value, old_value)
+
+class RunMetrics:
+    """Measurements of one run, see report() for their layout"""
+    def __init__(self, run_id, frame_hooks=True):
+        self.run_id = run_id
+        self.frame_hooks = frame_hooks
+        self.stages = {}
+        self.renders = {}
+        self.lock = threading.Lock()
+        self.started = None
+        self.ended = None
+        self.status = "pending"
+        self.caches_before = {}
+        self.caches_after = None
+        self.io_before = None
+        self.io_after = None
+
+    def start(self):
+        global active_run
+
+        self.started = time.time()
+        self.status = "running"
+        self.caches_before = cache_snapshot()
+        self.io_before = io_counters("/proc/self/io")
+        active_run = self
+        return self
+
+    def finish(self, status="ok"):
+        global active_run, last_report
+
+        self.ended = time.time()
+        self.status = status
+        self.caches_after = cache_snapshot()
+        self.io_after = io_counters("/proc/self/io")
+        if active_run is self:
+            active_run = None
+        last_report = self.report()
+        return last_report
+
+    def stage_stats(self, stage):
+        """Stats of stage, created empty on first use. Call with the lock held"""
+        return self.stages.setdefault(stage, {
+            "attempts": 0,
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "children_cpu_seconds": 0.0,
+            "read_bytes": None,
+            "written_bytes": None,
+        })
+
+    def add_thread_usage(self, stats, cpu, io, io_end):
+        """Add a thread's CPU time and I/O deltas to stats. Call with the lock held"""
+        stats["cpu_seconds"] += time.thread_time() - cpu
+        if io is not None and io_end is not None:
+            stats["read_bytes"] = (stats["read_bytes"] or 0) + io_end[0] - io[0]
+            stats["written_bytes"] = (stats["written_bytes"] or 0) + io_end[1] - io[1]
+
+    def instrument(self, stage, call):
+        """call, measured into the stats of stage each time it runs (in the calling thread)"""
+        def measured():
+            stage_context.name = stage
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            children = children_cpu_seconds()
+            io = io_counters()
+            try:
+                return call()
+            finally:
+                io_end = io_counters()
+                with self.lock:
+                    stats = self.stage_stats(stage)
+                    stats["attempts"] += 1
+                    stats["wall_seconds"] += time.perf_counter() - wall
+                    stats["children_cpu_seconds"] += children_cpu_seconds() - children
+                    self.add_thread_usage(stats, cpu, io, io_end)
+                    stats["peak_rss_mb"] = peak_rss_mb()
+                stage_context.name = None
+        return measured
+
+    def render_logger(self, name):
+        record = {
+            "stage": getattr(stage_context, "name", None),
+            "frames": 0,
+            "total": None,
+            "started": None,
+            "elapsed": 0.0,
+        }
+        with self.lock:
+            self.renders[name] = record
+        return FrameMeter(record)
+
+    def cache_report(self):
+        after = self.caches_after if self.caches_after is not None else cache_snapshot()
+        report = {}
+        for name, (hits, misses) in after.items():
+            hits_before, misses_before = self.caches_before.get(name, (0, 0))
+            hits, misses = hits - hits_before, misses - misses_before
+            report[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+        return report
+
+    def report(self):
+        """
+        Returns:
+            {run_id, status, started, wall_seconds, peak_rss_mb, read_bytes, written_bytes,
+            stages: {name: stats}, renders: {name: {stage, frames, total, seconds, fps}},
+            caches: {name: {hits, misses, hit_rate}}}, the process-wide bytes being None
+            where /proc is unavailable
+        """
+        with self.lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+            renders = {
+                name: {
+                    "stage": record["stage"],
+                    "frames": record["frames"],
+                    "total": record["total"],
+                    "seconds": record["elapsed"],
+                    "fps": record["frames"] / record["elapsed"] if record["elapsed"] else None,
+                }
+                for name, record in self.renders.items()
+            }
+
+        io_after = self.io_after if self.ended else io_counters("/proc/self/io")
+        io = None
+        if self.io_before is not None and io_after is not None:
+            io = (io_after[0] - self.io_before[0], io_after[1] - self.io_before[1])
+
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "started": self.started,
+            "wall_seconds": ((self.ended or time.time()) - self.started) if self.started else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "read_bytes": io[0] if io else None,
+            "written_bytes": io[1] if io else None,
+            "stages": stages,
+            "renders": renders,
+            "caches": self.cache_report(),
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def summary(self):
+        """One line per stage, for the console"""
+        report = self.report()
+        fps = {render["stage"]: render["fps"] for render in report["renders"].values() if render["fps"]}
+        lines = []
+        for name, stats in report["stages"].items():
+            line = f"  {name}: {stats['wall_seconds']:.1f}s wall, {stats['cpu_seconds']:.1f}s CPU"
+            if stats["children_cpu_seconds"] >= 0.1:
+                line += f" (+{stats['children_cpu_seconds']:.1f}s in subprocesses)"
+            if name in fps:
+                line += f", {fps[name]:.1f} fps"
+            lines.append(line)
+        return "\n".join(lines)
+
+def record_render(name, frames, seconds):
+    """Count a render made without a FrameMeter (e.g. by worker processes) in the active run"""
+    run = active_run
+    if run is None:
+        return
+    with run.lock:
+        run.renders[name] = {
+            "stage": getattr(stage_context, "name", None),
+            "frames": frames,
+            "total": frames,
+            "started": None,
+            "elapsed": seconds,
+        }
+
+def current_stage():
+    """Name of the stage the calling thread is running, if any"""
+    return getattr(stage_context, "name", None)
+
+@contextmanager
+def thread_usage(stage):
+    """
+    Count the CPU time and I/O of the calling thread in the stats of stage, in the active
+    run: for helper threads a stage starts, which its own measurement doesn't see
+    """
+    run = active_run
+    if run is None or stage is None:
+        yield
+        return
+
+    cpu = time.thread_time()
+    io = io_counters()
+    try:
+        yield
+    finally:
+        io_end = io_counters()
+        with run.lock:
+            run.add_thread_usage(run.stage_stats(stage), cpu, io, io_end)
+
+def render_logger(name):
+    """Logger for write_videofile: a FrameMeter of the active run when frame hooks are on, else moviepy's default bar"""
+    run = active_run
+    if run is None or not run.frame_hooks:
+        return "bar"
+    return run.render_logger(name)
+
+def current_report():
+    """Report of the running job, or of the last finished one"""
+    run = active_run
+    return run.report() if run is not None else last_report
+
+def prometheus_text(report):
+    """A report in the Prometheus text exposition format"""
+    if report is None:
+        return ""
+
+    run = f'run="{report["run_id"]}"'
+    lines = [
+        f"{PREFIX}_run_wall_seconds{{{run}}} {report['wall_seconds']:.3f}",
+        f"{PREFIX}_run_peak_rss_megabytes{{{run}}} {report['peak_rss_mb']:.1f}",
+    ]
+    for name, stats in report["stages"].items():
+        labels = f'{run},stage="{name}"'
+        lines.append(f"{PREFIX}_stage_wall_seconds{{{labels}}} {stats['wall_seconds']:.3f}")
+        lines.append(f"{PREFIX}_stage_cpu_seconds{{{labels}}} {stats['cpu_seconds']:.3f}")
+        if stats["read_bytes"] is not None:
+            lines.append(f"{PREFIX}_stage_read_bytes{{{labels}}} {stats['read_bytes']}")
+            lines.append(f"{PREFIX}_stage_written_bytes{{{labels}}} {stats['written_bytes']}")
+    for name, render in report["renders"].items():
+        labels = f'{run},render="{name}"'
+        lines.append(f"{PREFIX}_render_frames{{{labels}}} {render['frames']}")
+        if render["fps"] is not None:
+            lines.append(f"{PREFIX}_render_fps{{{labels}}} {render['fps']:.2f}")
+    for name, cache in report["caches"].items():
+        if cache["hit_rate"] is not None:
+            lines.append(f'{PREFIX}_cache_hit_rate{{{run},cache="{name}"}} {cache["hit_rate"]:.4f}')
+
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            data, content_type = prometheus_text(current_report()).encode(), "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            data, content_type = json.dumps(current_report()).encode(), "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve the current report on /metrics (Prometheus text) and /metrics.json, in a daemon thread"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📊 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,174 @@
+import json
+import time
+import random
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def backoff_delay(attempt, backoff=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter, for retry number attempt (0-based)"""
+    return random.uniform(0, min(max_delay, backoff * 2 ** attempt))
+
+class Stage:
+    """
+    One step of a pipeline: func is called with the results of its dependencies as
+    keyword arguments (named after the dependencies), plus the pipeline inputs it asks for
+
+    A stage whose attempts must not overlap (e.g. they write the same files) sets
+    retry_timeouts to False: a timed out attempt then fails the stage instead of being retried.
+    """
+    def __init__(self, name, func, deps=(), inputs=(), timeout=None, retries=0, backoff=1.0, process=False,
+                 retry_timeouts=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.process = process
+        self.retry_timeouts = retry_timeouts
+
+class Pipeline:
+    """
+    Dependency graph of stages executed with asyncio
+
+    Each stage starts as soon as all its dependencies are done, and runs in a worker thread
+    (or a worker process when process is set), so independent stages overlap. Failed or
+    timed out attempts are retried with exponential backoff. A timed out attempt is
+    abandoned, not killed: its thread runs to completion in the background, next to the
+    retry, so stages retried after a timeout must write each attempt's outputs apart.
+    run() returns, or raises, only once every attempt has finished, abandoned ones and those
+    of other stages when one fails included, so callers may remove the files they write.
+
+    Every run records a timeline of attempts, see timeline() and critical_path(). With a
+    metrics (ft_metrics.RunMetrics), thread stages are also measured attempt by attempt.
+    """
+    def __init__(self, max_workers=8, max_processes=None, metrics=None):
+        self.stages = {}
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self.metrics = metrics
+        self.records = {}
+        self.started = None
+
+    def add(self, name, func, deps=(), inputs=(), timeout=None, retries=0, backoff=1.0, process=False,
+            retry_timeouts=True):
+        for dep in deps:
+            if dep not in self.stages:
+                raise Exception(f"Stage {name} depends on unknown stage {dep}")
+
+        self.stages[name] = Stage(name, func, deps, inputs, timeout, retries, backoff, process, retry_timeouts)
+        return self.stages[name]
+
+    def stage(self, name=None, **kwargs):
+        """Decorator form of add()"""
+        def decorator(func):
+            self.add(name or func.__name__, func, **kwargs)
+            return func
+        return decorator
+
+    async def run_stage(self, stage, tasks, inputs, threads, processes):
+        results = {dep: await tasks[dep] for dep in stage.deps}
+        kwargs = {**{name: inputs[name] for name in stage.inputs}, **results}
+        call = functools.partial(stage.func, **kwargs)
+        if self.metrics is not None and not stage.process:
+            call = self.metrics.instrument(stage.name, call)
+
+        loop = asyncio.get_running_loop()
+        record = {"stage": stage.name, "deps": stage.deps, "attempts": [], "status": "running"}
+        self.records[stage.name] = record
+
+        for attempt in range(stage.retries + 1):
+            start = time.perf_counter() - self.started
+            try:
+                future = loop.run_in_executor(processes if stage.process else threads, call)
+                result = await asyncio.wait_for(future, stage.timeout)
+                record["attempts"].append({"start": start, "end": time.perf_counter() - self.started, "error": None})
+                record["status"] = "ok"
+                return result
+
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                error = "timed out" if timed_out else str(e)
+                record["attempts"].append({"start": start, "end": time.perf_counter() - self.started, "error": error})
+                print(f"❌ Stage {stage.name} attempt {attempt + 1} failed: {error}")
+
+                if attempt == stage.retries or (timed_out and not stage.retry_timeouts):
+                    record["status"] = "failed"
+                    raise Exception(f"Stage {stage.name} failed: {error}")
+
+                await asyncio.sleep(backoff_delay(attempt, stage.backoff))
+
+    async def run_async(self, **inputs):
+        self.records = {}
+        self.started = time.perf_counter()
+
+        threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        processes = ProcessPoolExecutor(max_workers=self.max_processes) if any(s.process for s in self.stages.values()) else None
+
+        tasks = {}
+        try:
+            # Stages were added after their dependencies, so this order is topological
+            for name, stage in self.stages.items():
+                tasks[name] = asyncio.ensure_future(self.run_stage(stage, tasks, inputs, threads, processes))
+
+            await asyncio.gather(*tasks.values())
+            return {name: task.result() for name, task in tasks.items()}
+
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            # Attempts not started are dropped, running ones (abandoned or not) waited for
+            threads.shutdown(wait=True, cancel_futures=True)
+            if processes:
+                processes.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, **inputs):
+        """Run the whole graph. Returns a dict of every stage result"""
+        return asyncio.run(self.run_async(**inputs))
+
+    def timeline(self):
+        """Start, end, attempts and status of every stage of the last run, in seconds since its start"""
+        timeline = []
+        for name, record in self.records.items():
+            attempts = record["attempts"]
+            timeline.append({
+                "stage": name,
+                "deps": record["deps"],
+                "status": record["status"],
+                "start": attempts[0]["start"] if attempts else None,
+                "end": attempts[-1]["end"] if attempts else None,
+                "attempts": attempts,
+            })
+        return timeline
+
+    def critical_path(self):
+        """
+        Chain of stages that determined the run's duration: from the last stage to finish,
+        repeatedly step to the dependency that finished last
+        """
+        ends = {t["stage"]: t["end"] for t in self.timeline() if t["end"] is not None}
+        if not ends:
+            return []
+
+        path = [max(ends, key=ends.get)]
+        while True:
+            deps = [dep for dep in self.stages[path[-1]].deps if dep in ends]
+            if not deps:
+                break
+            path.append(max(deps, key=ends.get))
+
+        return path[::-1]
+
+    def export_timeline(self, path):
+        timeline = self.timeline()
+        with open(path, "w") as f:
+            json.dump({
+                "stages": timeline,
+                "critical_path": self.critical_path(),
+                "wall_time": max((t["end"] for t in timeline if t["end"] is not None), default=0.0),
+            }, f, indent=2)
+        return path
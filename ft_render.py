@@ -0,0 +1,231 @@
+import os
+import time
+import random
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from ft_utils import build_tiktok
+from ft_metrics import render_logger, record_render
+from ft_streaming import write_videofile_streaming
+from subtitles import (
+    cache_stats,
+    create_emoji_clips,
+    create_subtitle_clips,
+    dump_cache_stats,
+    enable_disk_cache,
+    merge_cache_stats,
+    IntervalCompositeVideoClip,
+)
+from subtitles import disk_cache as sprite_disk_cache
+
+
+GOP_SECONDS = 1.0  # chunk boundaries fall on these keyframes
+
+
+def build_base(video_path, audio_path, music_path, general_config, video_start=0.0):
+    """The base of the TikTok: vertical footage and the audio mix, without overlays"""
+    return build_tiktok(
+        video_path=video_path,
+        audio_path=audio_path,
+        music_path=music_path,
+        music_volume=general_config["music_volume"],
+        original_audio_volume=general_config["original_audio_volume"],
+        global_blur=general_config["global_blur"],
+        video_start=video_start,
+    )
+
+def build_composition(video_path, audio_path, music_path, captions, emojis_timestamps, general_config, subtitles_config, video_start=0.0):
+    """Build the full TikTok render graph: base video, audio mix, emoji and caption overlays"""
+    base = build_base(video_path, audio_path, music_path, general_config, video_start)
+
+    emoji_clips = create_emoji_clips(
+        emojis_timestamps,
+        base.size,
+        base.duration,
+        base.fps,
+        **subtitles_config["emojis"]
+    )
+
+    subtitle_params = {k: v for k, v in subtitles_config.items() if k != "emojis"}
+    subtitle_clips = create_subtitle_clips(
+        captions=captions,
+        video_size=base.size,
+        **subtitle_params
+    )
+
+    composition = IntervalCompositeVideoClip([base] + emoji_clips + subtitle_clips)
+    composition = composition.set_audio(base.audio).set_duration(base.duration)
+    composition.fps = base.fps
+
+    return composition
+
+def render_tiktok(video_path, audio_path, music_path, captions, emojis_timestamps, general_config, subtitles_config, output_path='tiktok.mp4', video_start=0.0, tmp_dir=None, workers=1):
+    """
+    Render the whole TikTok in a single decode/encode pass. The temporary audio track goes to tmp_dir when given
+
+    With workers > 1 the timeline is rendered in chunks by as many processes, see render_tiktok_chunked
+    """
+    if workers > 1:
+        return render_tiktok_chunked(
+            video_path, audio_path, music_path, captions, emojis_timestamps, general_config, subtitles_config,
+            output_path=output_path, video_start=video_start, tmp_dir=tmp_dir, workers=workers,
+        )
+
+    composition = build_composition(
+        video_path=video_path,
+        audio_path=audio_path,
+        music_path=music_path,
+        captions=captions,
+        emojis_timestamps=emojis_timestamps,
+        general_config=general_config,
+        subtitles_config=subtitles_config,
+        video_start=video_start,
+    )
+
+    write_videofile_streaming(
+        composition,
+        output_path,
+        codec='libx264',
+        audio_codec='aac',
+        fps=composition.fps,
+        temp_audiofile=os.path.join(tmp_dir, "render_audio.m4a") if tmp_dir else None,
+        logger=render_logger("render"),
+    )
+    composition.close()
+    dump_cache_stats()
+
+    return output_path
+
+@contextmanager
+def seeded_random(seed):
+    """Seed the random module for the block (random music start, emoji animations), then restore its state"""
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+def chunk_ranges(n_frames, gop, chunks):
+    """Split frames [0, n_frames) into at most chunks ranges, all starting on a multiple of gop"""
+    n_gops = -(-n_frames // gop)
+    chunks = max(1, min(chunks, n_gops))
+    bounds = [round(i * n_gops / chunks) * gop for i in range(chunks)] + [n_frames]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def gop_params(gop):
+    """x264 options for a fixed GOP, so every chunk starts on a keyframe at the same cadence"""
+    return ["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+
+def init_render_worker(sprite_cache_dir, sprite_cache_max_bytes):
+    if sprite_cache_dir:
+        enable_disk_cache(sprite_cache_dir, sprite_cache_max_bytes)
+
+def render_chunk(composition_params, seed, start_frame, end_frame, gop, chunk_path):
+    """
+    Encode frames [start_frame, end_frame) of the composition to chunk_path, without audio
+
+    The composition is rebuilt from the same parameters and seed in every worker, and frames
+    are taken at the times write_videofile would use, so overlays spanning two chunks are
+    drawn the same on both sides.
+
+    Returns:
+        (frames written, worker process id, its render cache stats so far)
+    """
+    with seeded_random(seed):
+        composition = build_composition(**composition_params)
+
+    times = np.arange(0, composition.duration, 1.0 / composition.fps)[start_frame:end_frame]
+    writer = FFMPEG_VideoWriter(chunk_path, composition.size, composition.fps, codec="libx264", ffmpeg_params=gop_params(gop))
+    try:
+        for t in times:
+            writer.write_frame(composition.get_frame(t).astype("uint8"))
+    finally:
+        writer.close()
+        composition.close()
+
+    return len(times), os.getpid(), cache_stats()
+
+def render_tiktok_chunked(video_path, audio_path, music_path, captions, emojis_timestamps, general_config, subtitles_config, output_path='tiktok.mp4', video_start=0.0, tmp_dir=None, workers=2):
+    """
+    Render the TikTok as GOP-aligned chunks composited and encoded in parallel worker
+    processes, then concatenated without re-encoding. The audio mix is encoded once, by
+    this process, and muxed with the concatenated video. Only the workers build the overlays:
+    the frame count and the audio come from the base clip, which draws its random music start
+    first, so it matches theirs.
+    """
+    composition_params = {
+        "video_path": video_path,
+        "audio_path": audio_path,
+        "music_path": music_path,
+        "captions": captions,
+        "emojis_timestamps": emojis_timestamps,
+        "general_config": general_config,
+        "subtitles_config": subtitles_config,
+        "video_start": video_start,
+    }
+    seed = random.randrange(2**32)
+    work_dir = tempfile.mkdtemp(prefix="chunks-", dir=tmp_dir)
+
+    try:
+        with seeded_random(seed):
+            base = build_base(video_path, audio_path, music_path, general_config, video_start)
+
+        fps = base.fps
+        n_frames = len(np.arange(0, base.duration, 1.0 / fps))
+        gop = max(1, round(GOP_SECONDS * fps))
+        ranges = chunk_ranges(n_frames, gop, workers)
+
+        audio_path_out = os.path.join(work_dir, "audio.m4a")
+        base.audio.write_audiofile(audio_path_out, fps=44100, codec="aac", logger=None)
+        base.close()
+
+        print(f"🎞️ Rendering {n_frames} frames in {len(ranges)} chunks on {workers} workers...")
+        chunk_paths = [os.path.join(work_dir, f"chunk_{i:03d}.mp4") for i in range(len(ranges))]
+        sprite_cache = sprite_disk_cache.disk_cache
+        sprite_cache_dir = sprite_cache.root if sprite_cache else None
+        sprite_cache_max_bytes = sprite_cache.max_bytes if sprite_cache else None
+
+        start = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_render_worker, initargs=(sprite_cache_dir, sprite_cache_max_bytes)) as pool:
+            futures = [
+                pool.submit(render_chunk, composition_params, seed, start_frame, end_frame, gop, chunk_path)
+                for (start_frame, end_frame), chunk_path in zip(ranges, chunk_paths)
+            ]
+            results = [future.result() for future in futures]
+        record_render("render", sum(frames for frames, _, _ in results), time.perf_counter() - start)
+
+        # Stats are cumulative per worker: keep the last of each
+        worker_stats = {pid: stats for _, pid, stats in results}
+        dump_cache_stats(merge_cache_stats(list(worker_stats.values())))
+
+        list_path = os.path.join(work_dir, "chunks.txt")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{os.path.abspath(path)}'\n" for path in chunk_paths)
+
+        command = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio_path_out,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c", "copy", "-movflags", "+faststart",
+            output_path,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Failed to concatenate render chunks: {result.stderr.strip()}")
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return output_path
@@ -0,0 +1,109 @@
+"""
+Request-keyed cache of API responses (Claude, TTS, Whisper, subtitle formatting)
+
+Modes:
+    bypass: always call the API (default)
+    record: serve a response from the cache when there is one, else call the API and store it
+    replay: only serve from the cache, a missing response is an error
+
+The mode and the cache directory come from REPLAY_MODE and REPLAY_DIR, or set_replay_mode().
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+REPLAY_MODES = ("bypass", "record", "replay")
+
+replay_mode = os.getenv("REPLAY_MODE", "bypass")
+replay_dir = os.getenv("REPLAY_DIR", "./cache/replay")
+replay_hits = 0
+replay_misses = 0
+
+def set_replay_mode(mode, root=None):
+    global replay_mode, replay_dir
+
+    if mode not in REPLAY_MODES:
+        raise Exception(f"Unknown replay mode {mode}, expected one of {', '.join(REPLAY_MODES)}")
+
+    replay_mode = mode
+    if root is not None:
+        replay_dir = root
+
+def request_key(kind, request):
+    payload = json.dumps([kind, request], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def file_digest(path):
+    """Content hash of an uploaded file, to key requests sending it"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def entry_path(kind, key, ext):
+    return os.path.join(replay_dir, kind, f"{key}.{ext}")
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def load_entry(kind, key, binary):
+    path = entry_path(kind, key, "bin" if binary else "json")
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        data = f.read()
+    return data if binary else json.loads(data)["response"]
+
+def save_entry(kind, key, request, response, binary):
+    if binary:
+        write_atomic(entry_path(kind, key, "bin"), response)
+        response = None
+
+    write_atomic(
+        entry_path(kind, key, "json"),
+        json.dumps({"kind": kind, "request": request, "response": response}, indent=2, default=str).encode(),
+    )
+
+def cached_call(kind, request, call, encode=lambda r: r, decode=lambda d: d, binary=False):
+    """
+    Result of call() for this request, through the replay cache
+
+    Parameters:
+        kind: name of the API call, also the cache subdirectory
+        request: JSON-serializable description of everything that determines the response
+        call: performs the real request
+        encode, decode: convert the result to and from its stored JSON form
+        binary: the result is bytes, stored as is
+    """
+    global replay_hits, replay_misses
+
+    if replay_mode == "bypass":
+        return call()
+
+    key = request_key(kind, request)
+    stored = load_entry(kind, key, binary)
+
+    if stored is not None:
+        replay_hits += 1
+        return decode(stored)
+
+    replay_misses += 1
+    if replay_mode == "replay":
+        raise Exception(f"No recorded {kind} response for request {key[:12]} in {replay_dir}")
+
+    result = call()
+    save_entry(kind, key, request, result if binary else encode(result), binary)
+    return result
+
+def replay_stats():
+    return {"mode": replay_mode, "hits": replay_hits, "misses": replay_misses}
@@ -0,0 +1,263 @@
+"""
+Streaming render of moviepy clips: decode, composite and encode run at the same time
+
+write_videofile computes each frame (decode the footage, blit every overlay) and pipes it
+to ffmpeg on one thread, so the decoder, the compositor and the encoder take turns. Here:
+
+    decode thread -> bounded queue -> compositor threads -> reorder -> writer -> ffmpeg stdin
+
+The decode thread reads the bottom layer of the clip (the footage) in order into a frame
+buffer, the compositor threads blit the overlays playing at that time into the buffer in
+place, and the writer feeds the buffers to ffmpeg in frame order, then hands them back.
+Buffers are allocated once, and there are only a few of them, so a slow encoder stalls
+the decoder instead of letting frames pile up in memory.
+
+Frames are computed at the times write_videofile uses, and overlays are blended with the
+same arithmetic as moviepy's blit, so the output is the same frame for frame.
+"""
+
+import os
+import queue
+import threading
+
+import numpy as np
+import proglog
+
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from ft_metrics import current_stage, thread_usage
+
+
+COMPOSITOR_THREADS = 3
+BUFFERS_PER_THREAD = 2  # frames in flight: decoded, being composited or waiting to be written
+POLL_INTERVAL = 0.1
+
+class StreamAborted(Exception):
+    pass
+
+class BufferPool:
+    """Fixed set of preallocated frame buffers, acquire() blocks until one is free"""
+    def __init__(self, count, shape, stop):
+        self.free = queue.Queue()
+        self.stop = stop
+        for _ in range(count):
+            self.free.put(np.empty(shape, dtype=np.uint8))
+
+    def acquire(self):
+        return get(self.free, self.stop)
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+def get(source, stop):
+    """Blocking get that gives up when stop is set"""
+    while True:
+        try:
+            return source.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if stop.is_set():
+                raise StreamAborted()
+
+def put(target, item, stop):
+    """Blocking put that gives up when stop is set"""
+    while True:
+        try:
+            return target.put(item, timeout=POLL_INTERVAL)
+        except queue.Full:
+            if stop.is_set():
+                raise StreamAborted()
+
+def frame_times(clip, fps):
+    """The frame times of write_videofile (Clip.iter_frames)"""
+    return np.arange(0, clip.duration, 1.0 / fps)
+
+def split_layers(clip):
+    """
+    (base, overlays) of a clip: base(t) is the bottom layer's frame at t and overlays(t) the
+    clips to blit on it, in order. A composite whose first clip is an opaque full-frame video
+    (the footage) uses that clip as base, the others use their background.
+    """
+    if not isinstance(clip, CompositeVideoClip):
+        return clip.get_frame, lambda t: []
+
+    first = clip.clips[0] if clip.clips else None
+    covers_frame = (
+        first is not None
+        and first.mask is None
+        and not first.relative_pos
+        and tuple(first.size) == tuple(clip.size)
+        and tuple(first.pos(0)) == (0, 0)
+        and first.start == 0
+        and (first.end is None or first.end >= clip.duration)
+    )
+
+    if covers_frame:
+        return first.get_frame, lambda t: [c for c in clip.playing_clips(t) if c is not first]
+
+    return clip.bg.get_frame, clip.playing_clips
+
+def overlay_position(clip, ct, frame_w, frame_h, clip_w, clip_h):
+    """Top-left corner of clip at clip time ct, resolved like VideoClip.blit_on"""
+    pos = clip.pos(ct)
+
+    if isinstance(pos, str):
+        pos = {
+            "center": ["center", "center"],
+            "left": ["left", "center"],
+            "right": ["right", "center"],
+            "top": ["center", "top"],
+            "bottom": ["center", "bottom"],
+        }[pos]
+    else:
+        pos = list(pos)
+
+    if clip.relative_pos:
+        for i, dim in enumerate([frame_w, frame_h]):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+
+    if isinstance(pos[0], str):
+        pos[0] = {"left": 0, "center": (frame_w - clip_w) / 2, "right": frame_w - clip_w}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {"top": 0, "center": (frame_h - clip_h) / 2, "bottom": frame_h - clip_h}[pos[1]]
+
+    return int(pos[0]), int(pos[1])
+
+def blit_into(frame, clip, t):
+    """Blit clip's frame at t onto frame in place, as moviepy's blit_on would"""
+    ct = t - clip.start
+    img = clip.get_frame(ct)
+    mask = clip.mask.get_frame(ct) if clip.mask else None
+
+    if mask is not None and img.shape[:2] != mask.shape[:2]:
+        img = clip.fill_array(img, mask.shape)
+
+    frame_h, frame_w = frame.shape[:2]
+    clip_h, clip_w = img.shape[:2]
+    xp, yp = overlay_position(clip, ct, frame_w, frame_h, clip_w, clip_h)
+
+    x1, y1 = max(0, -xp), max(0, -yp)
+    x2, y2 = min(clip_w, frame_w - xp), min(clip_h, frame_h - yp)
+    xp1, yp1 = max(0, xp), max(0, yp)
+    xp2, yp2 = min(frame_w, xp + clip_w), min(frame_h, yp + clip_h)
+    if xp1 >= xp2 or yp1 >= yp2:
+        return
+
+    region = frame[yp1:yp2, xp1:xp2]
+    if mask is None:
+        region[...] = img[y1:y2, x1:x2]
+    else:
+        alpha = mask[y1:y2, x1:x2, None]
+        region[...] = 1.0 * alpha * img[y1:y2, x1:x2] + (1.0 - alpha) * region
+
+def stream_frames(clip, fps, write, workers=COMPOSITOR_THREADS, buffers=None, logger="bar"):
+    """
+    Compute every frame of clip at fps and pass them, in order, to write(frame)
+
+    The frame buffer passed to write is reused once write returns. Exceptions raised by
+    any stage stop the others and are raised here. The CPU time and I/O of the decode and
+    compositor threads count towards the pipeline stage of the calling thread (see ft_metrics).
+    """
+    times = frame_times(clip, fps)
+    width, height = clip.size
+    base, overlays = split_layers(clip)
+
+    stop = threading.Event()
+    errors = []
+    pool = BufferPool(buffers or workers * BUFFERS_PER_THREAD, (height, width, 3), stop)
+    decoded = queue.Queue(maxsize=workers)
+    composited = queue.Queue()
+    stage = current_stage()
+
+    def guarded(target):
+        def run():
+            try:
+                with thread_usage(stage):
+                    target()
+            except StreamAborted:
+                pass
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        return run
+
+    def decode():
+        for index, t in enumerate(times):
+            buffer = pool.acquire()
+            buffer[...] = base(t)
+            put(decoded, (index, t, buffer), stop)
+        for _ in range(workers):
+            put(decoded, None, stop)
+
+    def composite():
+        while True:
+            item = get(decoded, stop)
+            if item is None:
+                return
+            index, t, buffer = item
+            for overlay in overlays(t):
+                blit_into(buffer, overlay, t)
+            composited.put((index, buffer))
+
+    threads = [threading.Thread(target=guarded(decode), name="stream-decode", daemon=True)]
+    threads += [threading.Thread(target=guarded(composite), name=f"stream-composite-{n}", daemon=True) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # Write in frame order, holding frames that are composited early
+    pending = {}
+    try:
+        for index in proglog.default_bar_logger(logger).iter_bar(t=range(len(times))):
+            while index not in pending:
+                done, buffer = get(composited, stop)
+                pending[done] = buffer
+            buffer = pending.pop(index)
+            write(buffer)
+            pool.release(buffer)
+
+    except StreamAborted:
+        pass
+
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+def write_videofile_streaming(clip, filename, fps=None, codec="libx264", audio_codec="aac", preset="medium",
+                              ffmpeg_params=None, temp_audiofile=None, workers=COMPOSITOR_THREADS, logger="bar"):
+    """
+    Drop-in for clip.write_videofile: the audio track is written first, as moviepy does, then
+    the frames are streamed to ffmpeg (see stream_frames) and muxed with it
+
+    The audio file (temp_audiofile, by default next to filename) is removed once the video is written
+    """
+    fps = fps or clip.fps
+    audiofile = None
+    writer = None
+
+    try:
+        if clip.audio is not None:
+            audiofile = temp_audiofile or os.path.splitext(filename)[0] + "_stream_audio.m4a"
+            clip.audio.write_audiofile(audiofile, fps=44100, codec=audio_codec, logger=None)
+
+        writer = FFMPEG_VideoWriter(
+            filename,
+            clip.size,
+            fps,
+            codec=codec,
+            audiofile=audiofile,
+            preset=preset,
+            ffmpeg_params=ffmpeg_params,
+        )
+        stream_frames(clip, fps, writer.write_frame, workers=workers, logger=logger)
+    finally:
+        if writer is not None:
+            writer.close()
+        if audiofile and os.path.exists(audiofile):
+            os.remove(audiofile)
+
+    return filename
@@ -1,29 +1,236 @@
 import os
+import re
+import math
 import shutil
 import random
+import subprocess
 import yt_dlp
+from yt_dlp.networking import HEADRequest
 
 import pandas as pd
-from openai import OpenAI
+from openai.types.audio import TranscriptionVerbose
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from imageio_ffmpeg import get_ffmpeg_exe
 from PIL import Image, ImageFilter
+from ft_replay import cached_call, file_digest
+from ft_clients import get_openai_client
+from ft_metrics import render_logger
+from ft_streaming import write_videofile_streaming
 import numpy as np
 
 
-def cleanup_tmp():
+def available_cores():
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def cleanup_tmp(tmp_dir="./tmp"):
     """Clean up temporary directory"""
-    tmp_dir = "./tmp"
     if os.path.exists(tmp_dir):
         shutil.rmtree(tmp_dir)
     os.makedirs(tmp_dir, exist_ok=True)
 
-def get_random_video(urls_csv, output_path='video.mp4'):
+def footage_format(max_height=1080, max_tbr=None):
+    """yt-dlp format selector for a single-file stream capped in height and, optionally, in bitrate (kbit/s)"""
+    capped = f"[height<={max_height}]" + (f"[tbr<={max_tbr}]" if max_tbr else "")
+    return f"best[ext=mp4]{capped}/best[ext=mp4][height<={max_height}]/best[height<={max_height}]/best"
+
+def ffmpeg_headers(http_headers):
+    """-headers option of ffmpeg for the HTTP headers yt-dlp resolved with a stream"""
+    headers = "".join(f"{key}: {value}\r\n" for key, value in (http_headers or {}).items())
+    return ["-headers", headers] if headers else []
+
+def bytes_read(ffmpeg_log):
+    """Bytes ffmpeg read from its inputs, from the I/O statistics of a verbose log"""
+    return sum(int(n) for n in re.findall(r"Statistics: (\d+) bytes read", ffmpeg_log))
+
+def read_packets(source, maps=("0:v:0",), seek=None, max_frames=None, input_args=()):
+    """
+    Packets of a file or stream, listed by ffmpeg's framecrc muxer without decoding
+
+    With seek, reading starts at the keyframe before seek and times are the source's own.
+
+    Returns:
+        (packets, duration, bytes read): packets as {stream, time, size, key} dicts in
+        stream order, times in seconds, and the source duration (None when unknown)
+    """
+    command = [get_ffmpeg_exe(), "-loglevel", "verbose", *input_args]
+    if seek is not None:
+        command += ["-ss", f"{seek:.3f}"]
+    command += ["-i", source]
+    for stream in maps:
+        command += ["-map", stream]
+    command += ["-c", "copy", "-copyts"]
+    if max_frames:
+        command += ["-frames:v", str(max_frames)]
+    command += ["-f", "framecrc", "-"]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        log = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise Exception(f"Failed to read packets of {source}: {log}")
+
+    time_bases = {}
+    packets = []
+    for line in result.stdout.splitlines():
+        if line.startswith("#tb "):
+            stream, time_base = line[len("#tb "):].split(":", 1)
+            num, den = time_base.strip().split("/")
+            time_bases[int(stream)] = int(num) / int(den)
+            continue
+        if line.startswith("#") or not line.strip():
+            continue
+
+        # stream, dts, pts, duration, size, crc[, F=flags], the flags field only when not just "key"
+        fields = [field.strip() for field in line.split(",")]
+        stream = int(fields[0])
+        flags = int(fields[6][2:], 16) if len(fields) > 6 and fields[6].startswith("F=") else 1
+        packets.append({
+            "stream": stream,
+            "time": int(fields[2]) * time_bases[stream],
+            "size": int(fields[4]),
+            "key": bool(flags & 1),
+        })
+
+    duration = None
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    return packets, duration, bytes_read(result.stderr)
+
+def download_footage_range(url, output_path, duration, start=None, margin=2.0, max_height=1080, max_tbr=None, ydl_opts=None):
+    """
+    Download only duration + margin seconds of a video, from a random (or given) start,
+    at most max_height pixels high
+
+    yt-dlp resolves the stream, ffmpeg finds the keyframe at or before start, then copies the
+    range from that keyframe over HTTP, so only the bytes around the range are fetched. The
+    range starts on the keyframe: a stream copy can't start anywhere else without keeping the
+    frames before it.
+
+    Returns:
+        dict with the range (start on the keyframe), the bytes ffmpeg fetched over the network,
+        those of the packets in the first duration seconds, and the size of the full source
+    """
+    ydl_opts = {
+        'format': footage_format(max_height, max_tbr),
+        'quiet': True,
+        'no_warnings': True,
+        **(ydl_opts or {}),
+    }
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            source_bytes = info.get("filesize") or info.get("filesize_approx")
+            if not source_bytes:
+                with ydl.urlopen(HEADRequest(info["url"], headers=info.get("http_headers") or {})) as response:
+                    source_bytes = int(response.headers.get("Content-Length") or 0) or None
+
+        stream_url = info["url"]
+        headers = ffmpeg_headers(info.get("http_headers"))
+        fetched = 0
+
+        source_duration = info.get("duration")
+        if not source_duration:
+            _, source_duration, probe_bytes = read_packets(stream_url, max_frames=1, input_args=headers)
+            fetched += probe_bytes
+            if not source_duration:
+                raise Exception("unknown duration")
+
+        if start is None:
+            start = random.uniform(0, max(0.0, source_duration - duration - margin))
+
+        packets, _, probe_bytes = read_packets(stream_url, seek=start, max_frames=1, input_args=headers)
+        fetched += probe_bytes
+        keyframes = [packet["time"] for packet in packets if packet["key"]]
+        if not keyframes:
+            raise Exception(f"no keyframe found before {start:.3f}s")
+
+        # Rounded up: seeking a hair before the keyframe would land on the previous one
+        start = math.ceil(keyframes[0] * 1000) / 1000
+        length = min(duration + margin, source_duration - start)
+
+        command = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "verbose", *headers,
+            "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", stream_url,
+            "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy", "-avoid_negative_ts", "make_zero",
+            output_path,
+        ]
+
+        print(f"Downloading {length:.1f}s of video from: {url}")
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception("\n".join(result.stderr.strip().splitlines()[-5:]))
+        fetched += bytes_read(result.stderr)
+
+        infos = ffmpeg_parse_infos(output_path)
+        if "video_fps" not in infos:
+            raise Exception("no video in the downloaded range, the server may not support range requests")
+        if abs(infos["duration"] - length) > max(0.25, 2.0 / infos["video_fps"]):
+            raise Exception(f"downloaded range is {infos['duration']:.2f}s long, expected {length:.2f}s")
+
+        packets, _, _ = read_packets(output_path, maps=("0",))
+
+    except Exception as e:
+        raise Exception(f"Failed to download video range: {str(e)}")
+
+    if not source_bytes and info.get("tbr"):
+        source_bytes = int(info["tbr"] * 1000 / 8 * source_duration)
+
+    stats = {
+        "url": url,
+        "start": start,
+        "end": start + infos["duration"],
+        "height": info.get("height"),
+        "bytes_fetched": fetched,
+        "bytes_used": sum(packet["size"] for packet in packets if packet["time"] < duration),
+        "source_bytes": source_bytes,
+    }
+
+    report = f"✓ Fetched {fetched / 1e6:.1f} MB, {stats['bytes_used'] / 1e6:.1f} MB used"
+    if source_bytes:
+        report += f" (full video: {source_bytes / 1e6:.1f} MB)"
+    print(report)
+
+    return stats
+
+def get_random_video(urls_csv, output_path='video.mp4', store=None, offline=False, duration=None, max_height=1080, max_tbr=None):
+   """
+   Get a random video from urls_csv into output_path: from the footage store when given, else
+   downloaded. With a duration, only that many seconds (plus a small margin) are downloaded.
+   """
    df = pd.read_csv(urls_csv)
-   url = random.choice(df['url'].tolist())
+   urls = df['url'].tolist()
+
+   if store is not None:
+       # Random pick from the local footage library, linked into place
+       try:
+           path = store.pick(urls, offline=offline, duration=duration)
+           if os.path.exists(output_path):
+               os.remove(output_path)
+           try:
+               os.link(path, output_path)
+           except OSError:
+               shutil.copyfile(path, output_path)
+           return True
+
+       except Exception as e:
+           raise Exception(f"Failed to get video from footage store: {str(e)}")
+
+   url = random.choice(urls)
+
+   if duration is not None:
+       download_footage_range(url, output_path, duration, max_height=max_height, max_tbr=max_tbr)
+       return True
 
    try:
        ydl_opts = {
-           'format': 'best[ext=mp4]',
+           'format': footage_format(max_height, max_tbr),
            'outtmpl': output_path,
            'quiet': True,
            'no_warnings': True,
@@ -37,28 +244,121 @@ def get_random_video(urls_csv, output_path='video.mp4'):
    except Exception as e:
        raise Exception(f"Failed to download video: {str(e)}")
 
-def transcribe_audio(audio_path):
-    """Transcribe audio using OpenAI's Whisper API with word-level timestamps"""
+def get_random_segment(urls_csv, duration, output_path='video.mp4', store=None, offline=False, video_id=None):
+    """
+    Pick a random segment of pre-normalized 1080x1920 footage from the store, linked to
+    output_path. Returns the segment start time, on a keyframe.
+    With video_id, the segment is taken from that (already picked) video.
+    """
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        if video_id is None:
+            video_id = store.pick_mezzanine(pd.read_csv(urls_csv)['url'].tolist(), offline=offline)
+
+        start = store.segment_start(video_id, duration, offline=offline)
+        path = store.mezzanine_path_for(video_id)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(path, output_path)
+        except OSError:
+            shutil.copyfile(path, output_path)
+        return start
 
-        with open(audio_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                response_format="verbose_json",
-                timestamp_granularities=["word"]
-            )
+    except Exception as e:
+        raise Exception(f"Failed to get footage segment: {str(e)}")
 
-            return transcription
+def transcribe_audio(audio_path):
+    """Transcribe audio using OpenAI's Whisper API with word-level timestamps"""
+    try:
+        def transcribe():
+            with open(audio_path, "rb") as audio_file:
+                return get_openai_client().audio.transcriptions.create(
+                    file=audio_file,
+                    model="whisper-1",
+                    response_format="verbose_json",
+                    timestamp_granularities=["word"]
+                )
+
+        return cached_call(
+            "openai_transcription",
+            {"model": "whisper-1", "audio": file_digest(audio_path), "timestamp_granularities": ["word"]},
+            transcribe,
+            encode=lambda transcription: transcription.model_dump(),
+            decode=lambda data: TranscriptionVerbose.construct(**data),  # built like SDK responses, unvalidated
+        )
 
     except Exception as e:
         print(f"Error transcribing audio: {str(e)}")
         raise
 
+RESYNC_WINDOW = 8  # words searched ahead on both sides after a mismatch
+
+def normalize_word(word):
+    """Lowercase alphanumerics of a word, so punctuation, apostrophes and case never cause a mismatch"""
+    return re.sub(r"[^\w]", "", word.lower()).replace("_", "")
+
+def match_words(script_words, transcript_words, window=RESYNC_WINDOW):
+    """
+    Map script words to transcription words in a single pass
+
+    Equal words are matched in order. On a mismatch, the nearest point where both sequences
+    agree again (within window words) is searched, also accepting a word split in two on
+    either side ("3000" / "3" "000"). Script words skipped over are paired with the skipped
+    transcription words when there are as many (substitutions, e.g. misrecognized words)
+    and left unmatched otherwise. Cost is linear in the number of words.
+
+    Returns:
+        (mapping, exact): for each script word, the index of its transcription word or None,
+        and whether the words are equal rather than substituted
+    """
+    mapping = [None] * len(script_words)
+    exact = [False] * len(script_words)
+    i = j = 0
+
+    while i < len(script_words) and j < len(transcript_words):
+        if script_words[i] == transcript_words[j]:
+            mapping[i], exact[i] = j, True
+            i, j = i + 1, j + 1
+            continue
+
+        if j + 1 < len(transcript_words) and script_words[i] == transcript_words[j] + transcript_words[j + 1]:
+            mapping[i], exact[i] = j, True
+            i, j = i + 1, j + 2
+            continue
+
+        if i + 1 < len(script_words) and script_words[i] + script_words[i + 1] == transcript_words[j]:
+            mapping[i] = mapping[i + 1] = j
+            exact[i] = exact[i + 1] = True
+            i, j = i + 2, j + 1
+            continue
+
+        resync = None
+        for distance in range(1, 2 * window + 1):
+            for skip_script in range(max(0, distance - window), min(distance, window) + 1):
+                skip_transcript = distance - skip_script
+                a, b = i + skip_script, j + skip_transcript
+                if a < len(script_words) and b < len(transcript_words) and script_words[a] == transcript_words[b]:
+                    resync = (skip_script, skip_transcript)
+                    break
+            if resync:
+                break
+
+        skip_script, skip_transcript = resync or (1, 1)
+        if skip_script == skip_transcript:
+            for k in range(skip_script):
+                mapping[i + k] = j + k
+        i, j = i + skip_script, j + skip_transcript
+
+    return mapping, exact
+
 def get_segment_timestamps(transcription, subtitle_format):
     """
-    Extract timestamps and words for each subtitle segment
+    Extract timestamps and words for each subtitle segment, by aligning the segment words
+    with the transcription words (see match_words)
+
+    No segment is dropped: words without a transcription match are timed by interpolation
+    between their matched neighbours (or take the time of the word they substitute), and
+    are listed in the segment's "unmatched" entry.
 
     Args:
         transcription: Whisper API transcription response with word-level timestamps
@@ -69,58 +369,100 @@ def get_segment_timestamps(transcription, subtitle_format):
         - segment: str (the subtitle text)
         - start_time: float (segment start time)
         - end_time: float (segment end time)
-        - words: list of dicts with word-level timing info
+        - words: list of dicts with word-level timing info, one per word of the segment
+        - unmatched: list of the segment words that had no transcription match
     """
-    segments_info = []
-    current_pos = 0
-    full_text = transcription.text.lower()
-
-    # Accéder à la liste des segments de sous-titres
-    subtitles_segments = subtitle_format.subtitles_segments
-
-    for segment in subtitles_segments:
-        normalized_segment = segment.lower().strip('?!.,')
-        segment_pos = full_text.find(normalized_segment, current_pos)
+    transcript_words = transcription.words or []
+    duration = float(getattr(transcription, "duration", None) or (transcript_words[-1].end if transcript_words else 0.0))
+
+    segment_words = [segment.split() for segment in subtitle_format.subtitles_segments]
+    flat = [(s, word) for s, words in enumerate(segment_words) for word in words]
+
+    # Punctuation-only words (e.g. a dash) never match, they take the time of their neighbours
+    script_keys = [normalize_word(word) or None for _, word in flat]
+    keyed = [k for k, key in enumerate(script_keys) if key]
+    mapping, exact = match_words([script_keys[k] for k in keyed], [normalize_word(w.word) for w in transcript_words])
+
+    match_of = dict(zip(keyed, mapping))
+    exact_of = dict(zip(keyed, exact))
+    times = [None] * len(flat)
+    for k, index in match_of.items():
+        if index is not None:
+            times[k] = (transcript_words[index].start, transcript_words[index].end)
+
+    # Interpolate the unmatched runs between the surrounding matched words
+    k = 0
+    while k < len(flat):
+        if times[k] is not None:
+            k += 1
+            continue
+        end_run = k
+        while end_run < len(flat) and times[end_run] is None:
+            end_run += 1
+        start = times[k - 1][1] if k > 0 else 0.0
+        end = times[end_run][0] if end_run < len(flat) else max(duration, start)
+        step = (end - start) / (end_run - k)
+        for n in range(k, end_run):
+            times[n] = (start + (n - k) * step, start + (n - k + 1) * step)
+        k = end_run
 
-        if segment_pos == -1:
-            first_words = ' '.join(normalized_segment.split()[:3])
-            segment_pos = full_text.find(first_words, current_pos)
-
-        if segment_pos != -1:
-            text_before = full_text[:segment_pos]
-            words_before = len(text_before.split())
+    segments_info = []
+    k = 0
+    for segment, words in zip(subtitle_format.subtitles_segments, segment_words):
+        timed_words = []
+        unmatched = []
+        for word in words:
+            start_time, end_time = times[k]
+            timed_words.append({"word": word, "start_time": start_time, "end_time": end_time})
+            if script_keys[k] and not exact_of[k]:
+                unmatched.append(word)
+            k += 1
+
+        segments_info.append({
+            "segment": segment,
+            "start_time": timed_words[0]["start_time"] if timed_words else (segments_info[-1]["end_time"] if segments_info else 0.0),
+            "end_time": timed_words[-1]["end_time"] if timed_words else (segments_info[-1]["end_time"] if segments_info else 0.0),
+            "words": timed_words,
+            "unmatched": unmatched,
+        })
+
+        if unmatched:
+            print(f"NOTICE: {len(unmatched)}/{len(words)} words of segment \"{segment}\" not found in the transcription: {' '.join(unmatched)}")
 
-            # Get all words that belong to this segment
-            segment_words = []
-            word_count = len(normalized_segment.split())
+    return segments_info
 
-            if words_before < len(transcription.words):
-                start_time = transcription.words[words_before].start
+def blur_radius_from_global_blur(global_blur):
+    # Convertir global_blur (0-1) en radius (1-20)
+    return int(1 + (global_blur * 19))  # Map 0.0-1.0 to 1-20
 
-                # Collect words and their timing info
-                for i in range(words_before, min(words_before + word_count, len(transcription.words))):
-                    word_info = transcription.words[i]
-                    segment_words.append({
-                        "word": word_info.word,
-                        "start_time": word_info.start,
-                        "end_time": word_info.end
-                    })
+def media_duration(path):
+    return ffmpeg_parse_infos(path)["duration"]
 
-                # Calculate end time from last word
-                end_time = segment_words[-1]["end_time"] if segment_words else start_time
+def cover_crop_filters(src_size, target_size=(1080, 1920)):
+    """
+    ffmpeg filters center-cropping a video to the target aspect ratio at source resolution, then
+    scaling it: the same cover as build_tiktok's scale then center crop, on the sides for wide
+    sources and top and bottom for sources narrower than the target
+    """
+    src_w, src_h = src_size
+    target_width, target_height = target_size
 
-                segments_info.append({
-                    "segment": segment,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "words": segment_words,
-                })
+    crop_w = min(src_w, round(src_h * target_width / target_height / 2) * 2)
+    crop_h = min(src_h, round(crop_w * target_height / target_width / 2) * 2)
 
-                current_pos = segment_pos + len(normalized_segment)
+    return [
+        f"crop={crop_w}:{crop_h}:(iw-{crop_w})/2:(ih-{crop_h})/2",
+        f"scale={target_width}:{target_height}",
+        "setsar=1",
+    ]
 
-    return segments_info
+def build_tiktok(video_path, audio_path, music_path, music_volume=0.07, original_audio_volume=0.5, global_blur=0.0, music_start=None, video_start=0.0):
+    """
+    Build the cropped 1080x1920 base clip with its mixed audio track, without encoding it
 
-def create_tiktok(video_path, audio_path, music_path, music_volume=0.07, original_audio_volume=0.5, global_blur=0.0, output_path='tiktok.mp4'):
+    video_start is the offset of the footage segment to use. Footage that is already
+    1080x1920 (see FootageStore.ingest) is used as is, without resize or crop.
+    """
     # Load clips
     audio_voiceover = AudioFileClip(audio_path)
     video = VideoFileClip(video_path)
@@ -128,16 +470,19 @@ def create_tiktok(video_path, audio_path, music_path, music_volume=0.07, origina
     music = AudioFileClip(music_path)
 
     # Get random start time for theme music
-    max_start = max(0, music.duration - audio_voiceover.duration)
-    random_start = random.uniform(0, max_start)
+    if music_start is None:
+        max_start = max(0, music.duration - audio_voiceover.duration)
+        random_start = random.uniform(0, max_start)
+    else:
+        random_start = music_start
 
     # Cut theme music to match voiceover duration and set volume to 50%
     music = music.subclip(random_start, random_start + audio_voiceover.duration)
     music = music.volumex(music_volume)
 
     # Trim video and original audio to match voiceover length
-    video = video.subclip(0, audio_voiceover.duration)
-    original_audio = original_audio.subclip(0, audio_voiceover.duration)
+    video = video.subclip(video_start, video_start + audio_voiceover.duration)
+    original_audio = original_audio.subclip(video_start, video_start + audio_voiceover.duration)
 
     original_audio = original_audio.volumex(original_audio_volume)
 
@@ -148,21 +493,23 @@ def create_tiktok(video_path, audio_path, music_path, music_volume=0.07, origina
     target_width = 1080
     target_height = 1920
 
-    # Resize video to cover the target height while maintaining aspect ratio
-    height_ratio = target_height / video.h
-    video = video.resize(height=target_height)
+    if tuple(video.size) != (target_width, target_height):
+        # Resize video to cover the target frame while maintaining aspect ratio: to the target
+        # height when wider than 9:16, to the target width when narrower (portrait footage)
+        if video.w * target_height >= video.h * target_width:
+            video = video.resize(height=target_height)
+        else:
+            video = video.resize(width=target_width)
 
-    # Center crop to target width
-    x_center = video.w / 2
-    video = video.crop(x1=x_center - target_width/2,
-                      y1=0,
-                      x2=x_center + target_width/2,
-                      y2=target_height)
+        # Center crop to the target size
+        video = video.crop(x_center=video.w / 2,
+                          y_center=video.h / 2,
+                          width=target_width,
+                          height=target_height)
 
     # Appliquer le flou si global_blur > 0
     if global_blur > 0:
-        # Convertir global_blur (0-1) en radius (1-20)
-        blur_radius = int(1 + (global_blur * 19))  # Map 0.0-1.0 to 1-20
+        blur_radius = blur_radius_from_global_blur(global_blur)
 
         def blur_frame(get_frame, t):
             img = Image.fromarray(get_frame(t))
@@ -172,6 +519,93 @@ def create_tiktok(video_path, audio_path, music_path, music_volume=0.07, origina
         video = video.fl(blur_frame)
 
     # Set the final audio
-    final_video = video.set_audio(final_audio)
-    final_video.write_videofile(output_path, codec='libx264',
-                              audio_codec='aac')
+    return video.set_audio(final_audio)
+
+def tiktok_ffmpeg_command(video_path, audio_path, music_path, music_volume=0.07, original_audio_volume=0.5, global_blur=0.0, output_path='tiktok.mp4', music_start=None, video_start=0.0):
+    """
+    ffmpeg command rendering the same base TikTok as build_tiktok in one native filtergraph:
+    trim, center crop to 9:16 at source resolution then scale to 1080x1920, optional blur,
+    and the volume-adjusted mix of original audio, music and voiceover
+    """
+    voiceover_infos = ffmpeg_parse_infos(audio_path)
+    video_infos = ffmpeg_parse_infos(video_path)
+    music_infos = ffmpeg_parse_infos(music_path)
+    duration = voiceover_infos["duration"]
+
+    if music_start is None:
+        max_start = max(0, music_infos["duration"] - duration)
+        music_start = random.uniform(0, max_start)
+
+    # Crop before scaling so only the kept pixels are resized
+    video_filters = cover_crop_filters(video_infos["video_size"])
+    if global_blur > 0:
+        video_filters.append(f"gblur=sigma={blur_radius_from_global_blur(global_blur)}")
+
+    # Inputs are upmixed to stereo like moviepy's audio reader does, mono sources land at -3 dB per channel
+    stereo = "aformat=channel_layouts=stereo"
+    audio_filters = [
+        f"[1:a]{stereo},volume={music_volume}[music]",
+        f"[2:a]{stereo}[voiceover]",
+    ]
+    mix_inputs = "[music][voiceover]"
+    if video_infos["audio_found"]:
+        audio_filters.insert(0, f"[0:a]{stereo},volume={original_audio_volume}[original]")
+        mix_inputs = "[original]" + mix_inputs
+    n_inputs = mix_inputs.count("[")
+
+    # amix divides every input by the input count, scale back up to a plain sum like CompositeAudioClip
+    filtergraph = ";".join([
+        f"[0:v]{','.join(video_filters)}[v]",
+        *audio_filters,
+        f"{mix_inputs}amix=inputs={n_inputs}:duration=longest:dropout_transition=0,volume={n_inputs}[a]",
+    ])
+
+    return [
+        get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-ss", f"{video_start}", "-t", f"{duration}", "-i", video_path,
+        "-ss", f"{music_start}", "-t", f"{duration}", "-i", music_path,
+        "-i", audio_path,
+        "-filter_complex", filtergraph,
+        "-map", "[v]", "-map", "[a]",
+        "-t", f"{duration}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        output_path,
+    ]
+
+def create_tiktok(video_path, audio_path, music_path, music_volume=0.07, original_audio_volume=0.5, global_blur=0.0, output_path='tiktok.mp4', backend='moviepy', music_start=None, video_start=0.0):
+    """
+    Render the base TikTok to output_path
+
+    backend: 'moviepy' composes and encodes the clip in Python, 'ffmpeg' runs the equivalent
+    native filtergraph from tiktok_ffmpeg_command
+    """
+    if backend == 'ffmpeg':
+        command = tiktok_ffmpeg_command(
+            video_path,
+            audio_path,
+            music_path,
+            music_volume=music_volume,
+            original_audio_volume=original_audio_volume,
+            global_blur=global_blur,
+            output_path=output_path,
+            music_start=music_start,
+            video_start=video_start,
+        )
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Failed to render base video with ffmpeg: {result.stderr.strip()}")
+        return
+
+    final_video = build_tiktok(
+        video_path,
+        audio_path,
+        music_path,
+        music_volume=music_volume,
+        original_audio_volume=original_audio_volume,
+        global_blur=global_blur,
+        music_start=music_start,
+        video_start=video_start,
+    )
+    write_videofile_streaming(final_video, output_path, codec='libx264',
+                              audio_codec='aac', logger=render_logger("tiktok"))
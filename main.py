@@ -1,13 +1,21 @@
 import os
+import shutil
+import tempfile
+import pandas as pd
 from dotenv import load_dotenv
-from subtitles import write_subtitles, format_subtitles, add_animated_emojis
+from subtitles import format_subtitles, enable_disk_cache
 from ft_create_content import generate_content, create_tts
+from ft_render import render_tiktok
+from ft_footage import FootageStore
+from ft_pipeline import Pipeline
+from ft_align import align_audio
+from ft_metrics import RunMetrics, serve_metrics
 from ft_utils import (
-    cleanup_tmp,
     get_random_video,
+    get_random_segment,
+    media_duration,
     transcribe_audio,
     get_segment_timestamps,
-    create_tiktok,
 )
 
 load_dotenv()
@@ -19,17 +27,40 @@ PATHS = {
     "outputs_dir": "./results",
     "urls_csv": "./content_srcs/urls.csv",
     "music_path": "./content_srcs/theme.mp3",
+    "sprite_cache_dir": "./cache/sprites",
+    "footage_dir": "./footage",
 }
 
 CONFIG = {
     "account": {
         "account_topic": "Daily 'did you know' for adults",
     },
+    "footage": {
+        "max_bytes": 20 * 1024**3,
+        "offline": False,
+        "prefetch": True,
+        "mezzanine": True,
+        "max_seconds": 600,  # download and cache only a random window of each video, None for whole videos
+        "range_margin": 2.0,  # extra seconds when a window must be fetched again to fit a longer voiceover
+        "max_height": 1080,
+        "max_tbr": None,  # kbit/s
+    },
+    "sprites": {
+        "max_bytes": 2 * 1024**3,  # on-disk cache of rendered caption and emoji sprites
+    },
+    "metrics": {
+        "enabled": True,  # write <output>.metrics.json for every job
+        "frame_hooks": True,  # count frames rendered by write_videofile
+        "port": None,  # serve the running job's metrics on http://127.0.0.1:<port>/metrics
+    },
     "general": {
         "voice": "echo",
         "original_audio_volume": 0.1,
         "music_volume": 0.1,
         "global_blur": 0.0,
+        "alignment": "local",  # "local" (ft_align, offline) or "whisper"
+        "format_with_llm": False,  # split subtitles and pick emojis with Claude instead of locally
+        "render_workers": 1,  # > 1 renders GOP-aligned chunks in parallel processes (see ft_render)
     },
     "subtitles": {
         "font": os.path.join(PATHS[
@@ -46,6 +77,7 @@ CONFIG = {
         "padding": 50,
         "highlight_current_word": True,
         "increase_font_size": 0.1,
+        "flatten_sprites": True,
         "emojis": {
             "vertical_position": 700,
             "relative_size": 0.15,
@@ -54,97 +86,186 @@ CONFIG = {
     }
 }
 
-def main():
-    try:
-        print("\n=== Starting TikTok Video Generation ===\n")
-        cleanup_tmp()
+def open_footage_store(paths=PATHS, config=CONFIG):
+    return FootageStore(
+        paths["footage_dir"],
+        max_bytes=config["footage"]["max_bytes"],
+        max_seconds=config["footage"]["max_seconds"],
+        max_height=config["footage"]["max_height"],
+        max_tbr=config["footage"]["max_tbr"],
+        range_margin=config["footage"]["range_margin"],
+    )
+
+def build_job_pipeline(account_topic, tmp_dir, output_path, footage_store, paths=PATHS, config=CONFIG, script=None, metrics=None):
+    """
+    Stage graph of one TikTok. Footage selection and ingest do not depend on the script,
+    so they run while the content, TTS and subtitles stages wait on the APIs. Only the
+    segment stage waits for the voiceover, to pick a start leaving enough footage after it.
+    A script generated beforehand (see generate_contents) skips content generation.
+    """
+    pipeline = Pipeline(metrics=metrics)
+
+    tmp_gameplay = os.path.join(tmp_dir, "gameplay.mp4")
+    urls = pd.read_csv(paths["urls_csv"])["url"].tolist()
+    offline = config["footage"]["offline"]
+
+    @pipeline.stage(timeout=120, retries=2)
+    def content():
+        if script is not None:
+            return script
 
-        # Generate content
         print("\n📝 Generating content...")
-        script_text = generate_content(CONFIG["account"]["account_topic"])
+        script_text = generate_content(account_topic)
         print(f"✓ Generated script: \"{script_text}\"\n")
+        return script_text
 
-        # Create TTS
+    @pipeline.stage(deps=["content"], timeout=120, retries=2)
+    def tts(content):
+        # One file per attempt: an attempt abandoned on timeout may still write its own
         print("🎤 Creating text-to-speech audio...")
-        create_tts(script_text, CONFIG["general"]["voice"], 'tts.mp3')
+        fd, tmp_tts = tempfile.mkstemp(prefix="tts-", suffix=".mp3", dir=tmp_dir)
+        os.close(fd)
+        create_tts(content, config["general"]["voice"], os.path.basename(tmp_tts), tmp_dir=tmp_dir)
         print("✓ Audio generated successfully\n")
+        return tmp_tts
 
-        # Update paths
-        tmp_gameplay = os.path.join(PATHS["tmp_dir"], "gameplay.mp4")
-        tmp_tts = os.path.join(PATHS["tmp_dir"], "tts.mp3")
-        tmp_tiktok_1 = os.path.join(PATHS["tmp_dir"], "temp_tiktok_1.mp4")
-        tmp_tiktok_2 = os.path.join(PATHS["tmp_dir"], "temp_tiktok_2.mp4")
-        final_output = os.path.join(PATHS["outputs_dir"], "final_tiktok.mp4")
+    # Not retried after a timeout: the abandoned attempt would keep downloading and
+    # ingesting, and linking the gameplay, next to the retry
+    @pipeline.stage(timeout=1800, retries=1, retry_timeouts=False)
+    def footage():
+        print("🎮 Getting gameplay footage...")
+        if config["footage"]["mezzanine"]:
+            return footage_store.pick_mezzanine(urls, offline=offline)
 
-        # Create TikTok
-        print("🎬 Creating base TikTok video...")
-        get_random_video(PATHS["urls_csv"], output_path=tmp_gameplay)
+        get_random_video(paths["urls_csv"], output_path=tmp_gameplay, store=footage_store, offline=offline)
+        return None
 
-        create_tiktok(
-            video_path=tmp_gameplay,
-            audio_path=tmp_tts,
-            music_path=PATHS["music_path"],
-            music_volume=CONFIG["general"]["music_volume"],
-            original_audio_volume=CONFIG["general"]["original_audio_volume"],
-            global_blur=CONFIG["general"]["global_blur"],
-            output_path=tmp_tiktok_1
-        )
-        print("✓ Base video created successfully\n")
+    @pipeline.stage(deps=["tts", "footage"])
+    def segment(tts, footage):
+        video_start = 0.0
+        if config["footage"]["mezzanine"]:
+            video_start = get_random_segment(
+                paths["urls_csv"],
+                media_duration(tts),
+                output_path=tmp_gameplay,
+                store=footage_store,
+                offline=offline,
+                video_id=footage,
+            )
+        print("✓ Footage ready\n")
+        return video_start
 
-        for i in range(3):
-            try:
-                transcription = transcribe_audio(tmp_tts)
-                subtitle_format = format_subtitles(transcription)
-                smileys = subtitle_format.segment_smiley
-                break
+    @pipeline.stage(deps=["tts", "content"], timeout=120, retries=2)
+    def transcription(tts, content):
+        if config["general"]["alignment"] == "local":
+            return align_audio(tts, content)
+        return transcribe_audio(tts)
 
-            except Exception as e:
-                print(f"❌ Error: {str(e)}")
-                continue
-
-        # print("\n\n\n")
-        # print(f"SUBTITLES:\n{subtitle_format}\n")
-        # print("\n\n\n")
+    @pipeline.stage(deps=["transcription"], timeout=300)
+    def subtitle_format(transcription):
+        return format_subtitles(
+            transcription,
+            use_llm=config["general"]["format_with_llm"],
+            emoji_dir=config["subtitles"]["emojis"].get("emoji_dir", "./emojis"),
+        )
 
+    @pipeline.stage(deps=["transcription", "subtitle_format"])
+    def captions(transcription, subtitle_format):
         captions = get_segment_timestamps(transcription, subtitle_format)
 
-        smileys_timestamps = [(smiley, caption["start_time"]) for smiley, caption in zip(smileys, captions)]
+        smileys_timestamps = [(smiley, caption["start_time"]) for smiley, caption in zip(subtitle_format.segment_smiley, captions)]
         print(f"SMILEY_TIMESTAMPS:\n{smileys_timestamps}\n")
+        return captions, smileys_timestamps
 
-        # Add emojis to video
-        add_animated_emojis(
-            video_path=tmp_tiktok_1,
-            emojis_timestamps=smileys_timestamps,
-            output_path=tmp_tiktok_2,
-            **CONFIG["subtitles"]["emojis"]
+    @pipeline.stage(deps=["tts", "segment", "captions"])
+    def render(tts, segment, captions):
+        # Render base video, emojis and subtitles in a single encode
+        print("🎬 Rendering TikTok video...")
+        render_tiktok(
+            video_path=tmp_gameplay,
+            audio_path=tts,
+            music_path=paths["music_path"],
+            captions=captions[0],
+            emojis_timestamps=captions[1],
+            general_config=config["general"],
+            subtitles_config=config["subtitles"],
+            output_path=output_path,
+            video_start=segment,
+            tmp_dir=tmp_dir,
+            workers=config["general"].get("render_workers", 1),
         )
+        return output_path
 
-        write_subtitles(
-            font=CONFIG["subtitles"]["font"],
-            font_size=CONFIG["subtitles"]["font_size"],
-            stroke_width=CONFIG["subtitles"]["stroke_width"],
-            stroke_color=CONFIG["subtitles"]["stroke_color"],
-            shadow_blur=CONFIG["subtitles"]["shadow_blur"],
-            font_color=CONFIG["subtitles"]["font_color"],
-            word_highlight_color=CONFIG["subtitles"]["word_highlight_color"],
-            padding=CONFIG["subtitles"]["padding"],
-            highlight_current_word=CONFIG["subtitles"]["highlight_current_word"],
-            increase_font_size=CONFIG["subtitles"]["increase_font_size"],
-            vertical_position_offset=CONFIG["subtitles"]["vertical_position_offset"],
-            captions=captions,
-            tmp_tiktok=tmp_tiktok_2,
-            final_output=final_output,
-        )
+    return pipeline
+
+def run_job(account_topic, tmp_dir, output_path, footage_store=None, paths=PATHS, config=CONFIG, script=None):
+    """
+    Generate one TikTok for account_topic into output_path
+
+    All intermediate files go to tmp_dir, which must exist and belong to this job only,
+    so several jobs can run at the same time. The stage timeline and critical path are
+    written next to the output, as <output>.timeline.json, and so are the run metrics
+    (see ft_metrics), as <output>.metrics.json.
+    """
+    if footage_store is None:
+        footage_store = open_footage_store(paths, config)
+
+    output_stem = os.path.splitext(output_path)[0]
+    metrics = None
+    if config["metrics"]["enabled"]:
+        metrics = RunMetrics(os.path.basename(output_stem), frame_hooks=config["metrics"]["frame_hooks"])
+
+    pipeline = build_job_pipeline(account_topic, tmp_dir, output_path, footage_store, paths, config, script, metrics)
+
+    status = "failed"
+    if metrics:
+        metrics.start()
+    try:
+        pipeline.run()
+        status = "ok"
+    finally:
+        pipeline.export_timeline(output_stem + ".timeline.json")
+        print(f"⏱️ Critical path: {' -> '.join(pipeline.critical_path())}")
+        if metrics:
+            metrics.finish(status)
+            metrics.export(output_stem + ".metrics.json")
+            print(f"📊 Stage metrics:\n{metrics.summary()}")
 
+    print(f"✨ Final video generated: {output_path}\n")
+    return output_path
 
-        print(f"✨ Final video generated: {final_output}\n")
+def main():
+    tmp_dir = None
+    try:
+        print("\n=== Starting TikTok Video Generation ===\n")
+        # A private directory under tmp_dir: batches and other runs keep their own next to it
+        os.makedirs(PATHS["tmp_dir"], exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix="run-", dir=PATHS["tmp_dir"])
+        enable_disk_cache(PATHS["sprite_cache_dir"], CONFIG["sprites"]["max_bytes"])
+        if CONFIG["metrics"]["port"]:
+            serve_metrics(CONFIG["metrics"]["port"])
+
+        footage_store = open_footage_store()
+        if CONFIG["footage"]["prefetch"] and not CONFIG["footage"]["offline"]:
+            footage_store.prefetch(
+                pd.read_csv(PATHS["urls_csv"])["url"].tolist(),
+                ingest=CONFIG["footage"]["mezzanine"],
+            )
+
+        run_job(
+            CONFIG["account"]["account_topic"],
+            tmp_dir=tmp_dir,
+            output_path=os.path.join(PATHS["outputs_dir"], "final_tiktok.mp4"),
+            footage_store=footage_store,
+        )
 
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
         raise
     finally:
         print("🧹 Cleaning up temporary files...")
-        cleanup_tmp()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
         print("\n=== Process Complete ===\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""
+Local stand-in for the Anthropic and OpenAI endpoints the pipeline uses
+
+    python stub_server.py --port 8787
+    export ANTHROPIC_BASE_URL=http://127.0.0.1:8787 OPENAI_BASE_URL=http://127.0.0.1:8787/v1
+
+Responses are deterministic functions of the requests: Claude messages return canned topics
+and scripts (or a subtitle split, or a list of scripts, for structured output requests), TTS returns a tone lasting
+as long as the text would take to read, with the text in its metadata, and transcription
+reads that text back with evenly spaced word timings. No state is kept between requests.
+"""
+
+import re
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from imageio_ffmpeg import get_ffmpeg_exe
+
+
+WORD_DURATION = 0.35
+
+STUB_TOPICS = [
+    "Why octopuses have three hearts",
+    "The hidden reason we get goosebumps",
+    "How honey never goes bad",
+]
+
+STUB_SCRIPTS = [
+    "Octopuses have THREE hearts! Two pump blood to the gills, one to the body. And when they swim, the main heart stops beating. That's why they prefer crawling!",
+    "Goosebumps are a leftover from our furry ancestors! Tiny muscles pull each hair up to trap heat or look bigger. Your body still tries, even without the fur!",
+    "Archaeologists found 3000 year old honey in Egyptian tombs. Still edible! Almost no water, very acidic, and bees add an enzyme that makes hydrogen peroxide. Nature's perfect preservative!",
+]
+
+STUB_SMILEYS = ["🤯", "😱", "🔥", "🧠", "👀", "💡", "😂", "✨"]
+
+def pick(options, text):
+    return options[int(hashlib.sha256(text.encode()).hexdigest(), 16) % len(options)]
+
+def message_text(body):
+    """Concatenated text of the request's user messages"""
+    texts = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(block.get("text", "") for block in content or [] if block.get("type") == "text")
+    return "\n".join(texts)
+
+def subtitle_split(voiceover, max_words=6):
+    """Structured output of format_subtitles: the voiceover in short segments, one smiley each"""
+    match = re.search(r"text=(['\"])(.*?)\1", voiceover, re.S)
+    if match:
+        voiceover = match.group(2)
+    voiceover = voiceover.replace("VOICEOVER:", "").strip()
+
+    words = voiceover.split()
+    segments = [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+    return {
+        "complete_voiceover": voiceover,
+        "subtitles_segments": segments,
+        "segment_smiley": [pick(STUB_SMILEYS, segment) for segment in segments],
+    }
+
+def scripts(prompt):
+    """Structured output of generate_contents: as many canned topics and scripts as asked for"""
+    match = re.search(r"Write (\d+) different videos", prompt)
+    count = int(match.group(1)) if match else 1
+    return {"videos": [
+        {"topic": STUB_TOPICS[n % len(STUB_TOPICS)], "script": STUB_SCRIPTS[n % len(STUB_SCRIPTS)]}
+        for n in range(count)
+    ]}
+
+def anthropic_message(body):
+    text = message_text(body)
+    tools = body.get("tools") or []
+
+    if tools:
+        tool_input = scripts(text) if tools[0]["name"] == "tiktok_scripts" else subtitle_split(text)
+        content = [{"type": "tool_use", "id": "toolu_stub", "name": tools[0]["name"], "input": tool_input}]
+        stop_reason = "tool_use"
+    else:
+        answer = pick(STUB_TOPICS, text) if "topic writer" in text else pick(STUB_SCRIPTS, text)
+        content = [{"type": "text", "text": answer}]
+        stop_reason = "end_turn"
+
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "stub"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": len(text.split()), "output_tokens": 0},
+    }
+
+def speech(body):
+    """mp3 tone as long as the text takes to read, with the text stored as its comment tag"""
+    text = body.get("input", "")
+    duration = max(1.0, len(text.split()) * WORD_DURATION)
+    command = [
+        get_ffmpeg_exe(), "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration:.2f}",
+        "-ac", "1", "-metadata", f"comment={text}",
+        "-f", "mp3", "-",
+    ]
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+def transcription(audio):
+    """Verbose Whisper transcription of a stub speech file, from its comment tag"""
+    probe = subprocess.run(
+        [get_ffmpeg_exe(), "-i", "-", "-f", "ffmetadata", "-"],
+        input=audio, capture_output=True,
+    )
+    metadata = dict(
+        line.split("=", 1) for line in probe.stdout.decode(errors="replace").splitlines() if "=" in line
+    )
+    text = re.sub(r"\\(.)", r"\1", metadata.get("comment", ""))
+
+    words = []
+    for n, word in enumerate(text.split()):
+        word = word.strip(".,!?;:\"'")
+        if word:
+            words.append({"word": word, "start": round(n * WORD_DURATION, 2), "end": round((n + 1) * WORD_DURATION, 2)})
+
+    return {
+        "task": "transcribe",
+        "language": "english",
+        "duration": max(1.0, len(text.split()) * WORD_DURATION),
+        "text": text,
+        "words": words,
+        "segments": [],
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, payload, content_type="application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0].rstrip("/")
+
+        try:
+            if path.endswith("/messages"):
+                self.send(200, anthropic_message(json.loads(body)))
+
+            elif path.endswith("/audio/speech"):
+                self.send(200, speech(json.loads(body)), content_type="audio/mpeg")
+
+            elif path.endswith("/audio/transcriptions"):
+                form = BytesParser().parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                )
+                audio = next(part.get_payload(decode=True) for part in form.get_payload() if part.get_filename())
+                self.send(200, transcription(audio))
+
+            else:
+                self.send(404, {"error": {"type": "not_found", "message": f"No stub for {self.path}"}})
+
+        except Exception as e:
+            self.send(500, {"error": {"type": "stub_error", "message": str(e)}})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stub of the Anthropic and OpenAI APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"export ANTHROPIC_BASE_URL=http://{args.host}:{args.port} OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print("export ANTHROPIC_API_KEY=stub OPENAI_API_KEY=stub")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,8 @@
-from .subtitles import write_subtitles
-from .format_subtitles import format_subtitles
-from .emojis import add_animated_emojis
+from .subtitles import write_subtitles, create_subtitle_clips
+from .format_subtitles import format_subtitles, segment_voiceover
+from .emojis import add_animated_emojis, create_emoji_clips
+from .cache import cache_stats, clear_caches, dump_cache_stats, merge_cache_stats
+from .disk_cache import enable_disk_cache, disable_disk_cache
+from .compositor import IntervalCompositeVideoClip
+from .emoji_index import get_emoji_index
+from .emoji_picker import get_emoji_picker
@@ -0,0 +1,131 @@
+import threading
+
+from collections import OrderedDict
+
+import numpy
+
+
+caches = {}
+
+def estimate_size(value) -> int:
+    """Approximate memory held by a cached value, in bytes"""
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(v) for v in value)
+
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+
+    # moviepy clips: count the RGB frame, plus the float mask if any
+    size = getattr(value, "size", None)
+    if isinstance(size, (tuple, list)) and len(size) == 2:
+        w, h = size
+        mask_bytes = w * h * 8 if getattr(value, "mask", None) is not None else 0
+        return w * h * 3 + mask_bytes
+
+    return 64
+
+class RenderCache:
+    """
+    LRU cache keyed by the full argument tuple, bounded by entry count and approximate byte size
+    """
+    def __init__(self, name: str, max_entries: int = 4096, max_bytes: int | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+
+            self.misses += 1
+            return default
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, value):
+        size = estimate_size(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (value, size)
+            self.bytes += size
+
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or (self.max_bytes is not None and self.bytes > self.max_bytes and len(self.entries) > 1)
+            ):
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
+
+def merge_cache_stats(all_stats: list) -> dict:
+    """Sum cache_stats() of several processes, e.g. render workers"""
+    merged = {}
+    for stats in all_stats:
+        for name, cache in stats.items():
+            total = merged.setdefault(name, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0})
+            for field in total:
+                total[field] += cache[field]
+
+    for total in merged.values():
+        lookups = total["hits"] + total["misses"]
+        total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+    return merged
+
+def dump_cache_stats(stats: dict | None = None):
+    """Print cache_stats(), or the given (e.g. merged) stats"""
+    print("📊 Render cache stats:")
+    for name, stats in (stats if stats is not None else cache_stats()).items():
+        print(
+            f"  {name}: {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB, "
+            f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"{stats['evictions']} evictions"
+        )
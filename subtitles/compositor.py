@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from moviepy.editor import CompositeVideoClip
+
+
+class IntervalCompositeVideoClip(CompositeVideoClip):
+    """
+    CompositeVideoClip that only visits the clips active at time t
+
+    moviepy's CompositeVideoClip tests every clip for every frame. Here clips are indexed once
+    into fixed-width time buckets, so a frame only checks the few clips overlapping its bucket.
+    Clips are still blitted in their original order. The index is built at construction,
+    like moviepy's own duration and mask.
+    """
+    def __init__(self, clips, size=None, bg_color=None, use_bgclip=False, ismask=False, bucket_duration=0.5):
+        super().__init__(clips, size=size, bg_color=bg_color, use_bgclip=use_bgclip, ismask=ismask)
+
+        self.bucket_duration = bucket_duration
+        self.buckets, self.open_ended = index_clips(self.clips, bucket_duration)
+
+        if self.mask is not None:
+            self.mask = IntervalCompositeVideoClip(self.mask.clips, self.size, ismask=True, bg_color=0.0, bucket_duration=bucket_duration)
+
+    def playing_clips(self, t=0):
+        candidates = self.buckets.get(int(t // self.bucket_duration), [])
+
+        if self.open_ended:
+            candidates = sorted(candidates + self.open_ended, key=lambda item: item[0])
+
+        return [clip for _, clip in candidates if clip.is_playing(t)]
+
+def index_clips(clips, bucket_duration):
+    """
+    Returns:
+        (buckets, open_ended): buckets maps a bucket number to the (order, clip) pairs overlapping
+        it, open_ended lists the clips without an end time, which may play at any later time
+    """
+    buckets = defaultdict(list)
+    open_ended = []
+
+    for order, clip in enumerate(clips):
+        if clip.end is None:
+            open_ended.append((order, clip))
+            continue
+
+        first = int(clip.start // bucket_duration)
+        last = int(clip.end // bucket_duration)
+        for bucket in range(first, last + 1):
+            buckets[bucket].append((order, clip))
+
+    return dict(buckets), open_ended
@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+import numpy
+
+
+disk_cache = None
+font_digests = {}
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+EVICT_TO = 0.9  # eviction frees space down to this fraction of max_bytes
+
+def font_digest(path: str) -> str:
+    """Content hash of a font (or any asset) file, recomputed only when the file changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    if key not in font_digests:
+        with open(path, "rb") as f:
+            font_digests[key] = hashlib.sha256(f.read()).hexdigest()
+
+    return font_digests[key]
+
+class SpriteDiskCache:
+    """
+    On-disk store of rendered RGBA arrays, one .npy file per key
+
+    Entries are written to a temporary file and atomically renamed into place, so several
+    processes can read and write the same directory: a reader sees either nothing or a
+    complete file. Entries are loaded memory-mapped.
+
+    The store is capped at max_bytes. A hit bumps the file's modification time, and when
+    writes take the store over the cap the least recently used files are removed first. The
+    size is counted on disk when the cache opens and on each eviction, so files written by
+    other processes are counted too, then tracked from this process's own writes.
+    """
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.bytes = sum(size for _, _, size in self.entries())
+
+    def make_key(self, kind: str, asset: str | None, params: dict) -> str:
+        payload = json.dumps(
+            [kind, font_digest(asset) if asset else None, params],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.npy")
+
+    def entries(self):
+        """(path, last use, size) of every cached file"""
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:  # removed by another process meanwhile
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def load(self, key: str) -> numpy.ndarray | None:
+        path = self.path(key)
+        try:
+            array = numpy.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return array
+
+    def save(self, key: str, array: numpy.ndarray):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                numpy.save(f, numpy.ascontiguousarray(array))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            self.bytes += size
+            if self.bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Remove least recently used files until the store fits in EVICT_TO of max_bytes. Call with the lock held"""
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        self.bytes = sum(size for _, _, size in entries)
+
+        for path, _, size in entries:
+            if self.bytes <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+        }
+
+def enable_disk_cache(root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> SpriteDiskCache:
+    global disk_cache
+
+    disk_cache = SpriteDiskCache(root, max_bytes)
+    return disk_cache
+
+def disable_disk_cache():
+    global disk_cache
+
+    disk_cache = None
+
+def cached_array(kind: str, asset: str | None, params: dict, render) -> numpy.ndarray:
+    """
+    Return the array for (kind, asset content, params) from the disk cache, rendering and
+    storing it with render() on a miss. Renders directly when the disk cache is disabled.
+    """
+    if disk_cache is None:
+        return render()
+
+    key = disk_cache.make_key(kind, asset, params)
+    array = disk_cache.load(key)
+
+    if array is None:
+        array = render()
+        disk_cache.save(key, array)
+
+    return array
@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+import json
+
+
+MANIFEST_NAME = "manifest.json"
+
+VARIATION_SELECTOR = "️"
+ZWJ = "‍"
+SKIN_TONES = {chr(codepoint) for codepoint in range(0x1F3FB, 0x1F400)}
+
+emoji_indexes = {}
+
+def emoji_key(sequence: str) -> str:
+    """Asset file stem of an emoji sequence, e.g. '❤️' -> 'U2764FE0F'"""
+    return "U" + "".join(f"{ord(char):X}" for char in sequence)
+
+def stem_sequence(stem: str) -> str:
+    """
+    Emoji sequence of an asset file stem, the inverse of emoji_key. Codepoints are 5 hex
+    digits in the 1Fxxx and E00xx (tag) blocks, 2 digits for keycap bases, © and ®, else 4.
+    """
+    digits = stem[1:]
+    sequence = []
+    i = 0
+    while i < len(digits):
+        rest = digits[i:]
+        if rest.startswith(("1F", "E00")):
+            length = 5
+        elif re.match(r"(23|2A|3[0-9]|A9|AE)(FE0F|20E3|$)", rest):
+            length = 2
+        else:
+            length = 4
+        sequence.append(chr(int(rest[:length], 16)))
+        i += length
+    return "".join(sequence)
+
+def lookup_candidates(emoji: str) -> list[str]:
+    """
+    Sequences to try for an emoji, most specific first: as given, without or with the FE0F
+    variation selector (after the first or last codepoint), without skin tone modifiers,
+    then the first ZWJ component and the first codepoint
+    """
+    emoji = emoji.strip()
+    if not emoji:
+        return []
+
+    no_vs = emoji.replace(VARIATION_SELECTOR, "")
+    no_tone = "".join(char for char in emoji if char not in SKIN_TONES)
+    no_tone_no_vs = no_tone.replace(VARIATION_SELECTOR, "")
+    first_component = emoji.split(ZWJ)[0]
+    first_component_no_tone = "".join(char for char in first_component if char not in SKIN_TONES)
+
+    candidates = [
+        emoji,
+        no_vs,
+        no_vs[:1] + VARIATION_SELECTOR + no_vs[1:],
+        no_vs + VARIATION_SELECTOR,
+        no_tone,
+        no_tone_no_vs,
+        first_component,
+        first_component.replace(VARIATION_SELECTOR, ""),
+        first_component_no_tone,
+        first_component_no_tone.replace(VARIATION_SELECTOR, ""),
+        emoji[0],
+        emoji[0] + VARIATION_SELECTOR,
+    ]
+
+    return list(dict.fromkeys(candidate for candidate in candidates if candidate))
+
+class EmojiIndex:
+    """
+    In-memory map from emoji sequences to asset files, built from one directory listing
+    (or a prebuilt manifest) so lookups never touch the filesystem
+    """
+    def __init__(self, emoji_dir: str, stems):
+        self.emoji_dir = emoji_dir
+        self.files = {stem: os.path.join(emoji_dir, f"{stem}.png") for stem in stems}
+        self.resolved = {}
+
+    @classmethod
+    def from_directory(cls, emoji_dir: str) -> "EmojiIndex":
+        manifest_path = os.path.join(emoji_dir, MANIFEST_NAME)
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                stems = json.load(f)["files"]
+        else:
+            stems = list_emoji_stems(emoji_dir)
+
+        return cls(emoji_dir, stems)
+
+    def lookup(self, emoji: str) -> str | None:
+        """Path of the best matching asset for an emoji, or None"""
+        if emoji not in self.resolved:
+            self.resolved[emoji] = next(
+                (self.files[key] for key in map(emoji_key, lookup_candidates(emoji)) if key in self.files),
+                None,
+            )
+
+        return self.resolved[emoji]
+
+    def __contains__(self, emoji: str) -> bool:
+        return self.lookup(emoji) is not None
+
+    def sequences(self) -> list[str]:
+        """Every emoji with an asset"""
+        return [stem_sequence(stem) for stem in self.files]
+
+def list_emoji_stems(emoji_dir: str) -> list[str]:
+    return sorted(
+        name[:-len(".png")]
+        for name in os.listdir(emoji_dir)
+        if name.startswith("U") and name.endswith(".png")
+    )
+
+def get_emoji_index(emoji_dir: str = "./emojis") -> EmojiIndex:
+    """Index for emoji_dir, built on first use"""
+    key = os.path.abspath(emoji_dir)
+
+    if key not in emoji_indexes:
+        emoji_indexes[key] = EmojiIndex.from_directory(emoji_dir)
+
+    return emoji_indexes[key]
+
+def write_emoji_manifest(emoji_dir: str = "./emojis") -> str:
+    """Write the prebuilt manifest loaded by EmojiIndex.from_directory"""
+    manifest_path = os.path.join(emoji_dir, MANIFEST_NAME)
+
+    with open(manifest_path, "w") as f:
+        json.dump({"files": list_emoji_stems(emoji_dir)}, f)
+
+    return manifest_path
+
+if __name__ == "__main__":
+    print(write_emoji_manifest(sys.argv[1] if len(sys.argv) > 1 else "./emojis"))
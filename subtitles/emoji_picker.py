@@ -0,0 +1,129 @@
+import os
+import re
+import hashlib
+import unicodedata
+
+from collections import defaultdict
+
+from .emoji_index import get_emoji_index, SKIN_TONES, VARIATION_SELECTOR, ZWJ
+
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for", "with", "by",
+    "from", "up", "down", "out", "is", "are", "was", "were", "be", "been", "it", "its", "it's",
+    "this", "that", "that's", "these", "those", "you", "your", "you're", "we", "they", "he",
+    "she", "i", "me", "my", "our", "their", "his", "her", "them", "us", "as", "so", "if",
+    "then", "than", "just", "not", "no", "do", "does", "did", "have", "has", "had", "can",
+    "will", "would", "could", "should", "what", "when", "where", "why", "how", "who", "which",
+    "all", "any", "some", "more", "most", "very", "too", "even", "still", "ever", "never",
+    "one", "two", "three", "into", "about", "like", "get", "got", "make", "made", "there",
+    "here", "now", "only", "also", "really", "literally", "without", "each", "every", "after",
+    "before", "over", "under", "off", "sign", "symbol", "letter", "type",
+}
+
+# Script words that name-based matching would miss, mapped to emoji name keywords
+ALIASES = {
+    "laugh": "joy", "funny": "joy", "lol": "joy", "hilarious": "rolling",
+    "scary": "scream", "terrify": "scream", "fear": "fearful", "afraid": "fearful",
+    "shock": "astonished", "surprise": "astonished", "wow": "astonished", "mind": "exploding",
+    "love": "heart", "think": "thinking", "idea": "bulb", "smart": "brain",
+    "dead": "skull", "die": "skull", "dying": "skull", "kill": "skull",
+    "money": "money", "rich": "money", "cash": "dollar", "expensive": "money",
+    "hot": "fire", "amazing": "star", "secret": "shushing", "look": "eyes", "see": "eyes",
+    "fast": "zap", "energy": "zap", "time": "clock", "science": "microscope", "sleep": "sleeping",
+    "win": "trophy", "best": "trophy", "world": "globe", "earth": "globe", "history": "scroll",
+}
+
+FALLBACK_EMOJIS = ["🤯", "😱", "🔥", "👀", "✨", "💡", "😮", "🤔", "😲", "⚡"]
+
+emoji_pickers = {}
+
+def stem(word):
+    """Crude English stem, enough to match 'hearts' with 'heart' or 'crying' with 'cry'"""
+    word = re.sub(r"[^a-z0-9']", "", word.lower()).strip("'")
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def emoji_keywords(sequence):
+    """
+    Stemmed name words of an emoji, or None for sequences not worth picking (skin tone
+    variants, flags, keycaps and codepoints unknown to this Python's unicodedata)
+    """
+    if any(char in SKIN_TONES for char in sequence) or "⃣" in sequence:
+        return None
+
+    names = []
+    for char in sequence:
+        if char in (VARIATION_SELECTOR, ZWJ) or 0xE0020 <= ord(char) <= 0xE007F:
+            continue
+        name = unicodedata.name(char, None)
+        if name is None or name.startswith("REGIONAL INDICATOR"):
+            return None
+        names.append(name)
+
+    words = [stem(word) for word in " ".join(names).lower().replace("-", " ").split()]
+    return [word for word in words if word and word not in STOPWORDS]
+
+class EmojiPicker:
+    """
+    Picks an emoji for a subtitle segment from the words of emoji names, restricted to the
+    emojis of an EmojiIndex, so the choice always has an asset. Rarer name words weigh more,
+    and emojis with shorter names are preferred.
+    """
+    def __init__(self, emoji_index):
+        self.keywords = {}
+        self.by_keyword = defaultdict(list)
+
+        for sequence in emoji_index.sequences():
+            keywords = emoji_keywords(sequence)
+            if not keywords:
+                continue
+            self.keywords[sequence] = keywords
+            for keyword in set(keywords):
+                self.by_keyword[keyword].append(sequence)
+
+        self.fallbacks = [emoji for emoji in FALLBACK_EMOJIS if emoji in emoji_index] or list(self.keywords)[:10]
+
+    def ranked(self, text):
+        """Candidate emojis for text, best first, with their scores"""
+        scores = defaultdict(float)
+
+        for word in text.split():
+            word = stem(word)
+            if not word or word in STOPWORDS:
+                continue
+            for keyword in {word, ALIASES.get(word)} - {None}:
+                candidates = self.by_keyword.get(keyword, [])
+                for sequence in candidates:
+                    scores[sequence] += 1.0 / len(candidates) ** 0.5
+
+        for sequence in scores:
+            scores[sequence] /= 1.0 + 0.15 * len(self.keywords[sequence])
+
+        return sorted(scores.items(), key=lambda item: (-item[1], len(item[0]), item[0]))
+
+    def pick(self, text, previous=None):
+        """Best emoji for text, avoiding a repeat of previous when there is another match"""
+        ranked = [sequence for sequence, _ in self.ranked(text) if sequence != previous]
+        if ranked:
+            return ranked[0]
+
+        digest = int(hashlib.sha1(text.encode()).hexdigest(), 16)
+        fallbacks = [emoji for emoji in self.fallbacks if emoji != previous] or self.fallbacks
+        return fallbacks[digest % len(fallbacks)]
+
+def get_emoji_picker(emoji_dir="./emojis"):
+    """Picker over the assets of emoji_dir, built on first use"""
+    key = os.path.abspath(emoji_dir)
+
+    if key not in emoji_pickers:
+        emoji_pickers[key] = EmojiPicker(get_emoji_index(emoji_dir))
+
+    return emoji_pickers[key]
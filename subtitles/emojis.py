@@ -1,14 +1,110 @@
-import os
 import random
 import numpy as np
 
-from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip
+from PIL import Image
+from moviepy.editor import VideoFileClip, ImageClip, VideoClip
+from ft_metrics import render_logger
+from ft_streaming import write_videofile_streaming
+from .disk_cache import cached_array
+from .compositor import IntervalCompositeVideoClip
+from .emoji_index import get_emoji_index
 
 
-def add_animated_emojis(
-    video_path,
+def load_emoji_sprite(emoji_path, height):
+    """Load an emoji PNG resized to the given height as an RGBA array, through the on-disk sprite cache when enabled"""
+    def render():
+        img = Image.open(emoji_path).convert("RGBA")
+        width = int(img.width * height / img.height)
+        return np.array(img.resize((width, height), Image.LANCZOS))
+
+    return cached_array("emoji", emoji_path, {"height": height}, render)
+
+ANIMATIONS = ["bounce", "wiggle", "circle", "figure8", "zoom"]
+
+def animation_tracks(name, n_frames, fps, center_x, vertical_position, sprite_size, animation_params):
+    """
+    Per-frame position and scale of an emoji animation, computed for all frames at once
+
+    Returns:
+    - (x, y, scale) arrays of length n_frames, frame i being shown at t = i / fps
+    """
+    t = np.arange(n_frames) / fps
+    x = np.full(n_frames, float(center_x))
+    y = np.full(n_frames, float(vertical_position))
+    scale = np.ones(n_frames)
+
+    if name == "bounce":
+        y += np.sin(t * 2 * np.pi) * animation_params['bounce_amplitude']
+
+    elif name == "wiggle":
+        x += np.sin(t * 3 * np.pi) * animation_params['wiggle_amplitude']
+
+    elif name == "circle":
+        x += np.cos(t * 2 * np.pi) * animation_params['circle_radius']
+        y += np.sin(t * 2 * np.pi) * animation_params['circle_radius']
+
+    elif name == "figure8":
+        x += np.sin(t * 2 * np.pi) * animation_params['figure8_x_amplitude']
+        y += np.sin(t * 4 * np.pi) * animation_params['figure8_y_amplitude']
+
+    elif name == "zoom":
+        # Pulse around the sprite center
+        w, h = sprite_size
+        scale = 1 + np.sin(t * animation_params['zoom_frequency'] * np.pi) * animation_params['zoom_amplitude']
+        x -= (w * scale - w) / 2
+        y -= (h * scale - h) / 2
+
+    else:
+        raise ValueError(f"Unknown animation: {name}")
+
+    return x, y, scale
+
+def scaled_sprite_table(img, mask, scales, levels):
+    """
+    Pre-resize a sprite at a few quantized scales
+
+    Returns:
+    - (table, level_index): table is a list of (img, mask) pairs, level_index maps each
+      entry of scales to its table entry
+    """
+    low, high = scales.min(), scales.max()
+    if high - low < 1e-6:
+        return [(img, mask)], np.zeros(len(scales), dtype=int)
+
+    quantized = np.linspace(low, high, levels)
+    level_index = np.abs(scales[:, None] - quantized[None, :]).argmin(axis=1)
+
+    rgb = Image.fromarray(img)
+    alpha = Image.fromarray((mask * 255).astype(np.uint8))
+    table = []
+    for scale in quantized:
+        size = (max(1, int(round(rgb.width * scale))), max(1, int(round(rgb.height * scale))))
+        table.append((
+            np.asarray(rgb.resize(size, Image.LANCZOS)),
+            np.asarray(alpha.resize(size, Image.LANCZOS)) / 255,
+        ))
+
+    return table, level_index
+
+def animated_sprite_clip(img, mask, tracks, fps, scale_levels=16):
+    """Clip showing a sprite along precomputed tracks: each frame is an index lookup, with no resampling"""
+    x, y, scale = tracks
+    table, level_index = scaled_sprite_table(img, mask, scale, scale_levels)
+    last = len(x) - 1
+
+    def frame_index(t):
+        return min(max(int(round(t * fps)), 0), last)
+
+    clip = VideoClip(make_frame=lambda t: table[level_index[frame_index(t)]][0])
+    clip.mask = VideoClip(make_frame=lambda t: table[level_index[frame_index(t)]][1], ismask=True)
+
+    return clip.set_position(lambda t: (x[frame_index(t)], y[frame_index(t)]))
+
+def create_emoji_clips(
     emojis_timestamps,
-    output_path=None,
+    video_size,
+    duration,
+    fps=30,
     emoji_dir="./emojis",
     vertical_position=600,
     relative_size=0.15,
@@ -21,96 +117,57 @@ def add_animated_emojis(
         'figure8_y_amplitude': 15,
         'zoom_amplitude': 0.15,
         'zoom_frequency': 3
-    }
+    },
+    scale_levels=16,
 ):
     """
-    Add animated emoji overlays to video based on timestamps
+    Build the animated emoji overlay clips for a video, without rendering them
 
     Parameters:
-    - video_path: path to input video
     - emojis_timestamps: list of tuples (emoji_char, start_time)
-    - output_path: path for output video (optional)
+    - video_size: (width, height) of the video the emojis are drawn on
+    - duration: duration of that video, used as end time of the last emoji
+    - fps: frame rate of that video, animations are precomputed per frame
     - emoji_dir: directory containing emoji PNG files
     - vertical_position: fixed Y position for emojis
     - relative_size: emoji height relative to video height (0-1)
     - min_duration_for_animation: minimum duration for animated emojis
     - animation_params: dictionary of animation parameters
-    """
-    if output_path is None:
-        output_path = video_path.replace('.mp4', '_with_emojis.mp4')
+    - scale_levels: number of pre-resized sprites used for zoom animations
 
-    video = VideoFileClip(video_path)
-    duration = video.duration
+    Returns:
+    - list of positioned and timed emoji clips
+    """
+    video_w, video_h = video_size
+    emoji_index = get_emoji_index(emoji_dir)
     emoji_clips = []
 
-    def get_animation(clip, center_x):
-        """Internal function to generate random animation"""
-        animations = [
-            # Bounce
-            {
-                'position': lambda t: (center_x, vertical_position + np.sin(t * 2 * np.pi) * animation_params['bounce_amplitude']),
-                'scale': lambda t: 1.0
-            },
-
-            # Wiggle
-            {
-                'position': lambda t: (center_x + np.sin(t * 3 * np.pi) * animation_params['wiggle_amplitude'], vertical_position),
-                'scale': lambda t: 1.0
-            },
-
-            # Circle
-            {
-                'position': lambda t: (
-                    center_x + np.cos(t * 2 * np.pi) * animation_params['circle_radius'],
-                    vertical_position + np.sin(t * 2 * np.pi) * animation_params['circle_radius']
-                ),
-                'scale': lambda t: 1.0
-            },
-
-            # Figure 8
-            {
-                'position': lambda t: (
-                    center_x + np.sin(t * 2 * np.pi) * animation_params['figure8_x_amplitude'],
-                    vertical_position + np.sin(t * 4 * np.pi) * animation_params['figure8_y_amplitude']
-                ),
-                'scale': lambda t: 1.0
-            },
-
-            # Zoom pulse
-            {
-                'position': lambda t: (
-                    center_x - (clip.w * (1 + np.sin(t * animation_params['zoom_frequency'] * np.pi) * animation_params['zoom_amplitude']) - clip.w) / 2,
-                    vertical_position - (clip.h * (1 + np.sin(t * animation_params['zoom_frequency'] * np.pi) * animation_params['zoom_amplitude']) - clip.h) / 2
-                ),
-                'scale': lambda t: 1 + np.sin(t * animation_params['zoom_frequency'] * np.pi) * animation_params['zoom_amplitude']
-            }
-        ]
-
-        return random.choice(animations)
-
     for i, (emoji_char, start_time) in enumerate(emojis_timestamps):
         end_time = duration if i == len(emojis_timestamps) - 1 else emojis_timestamps[i + 1][1]
         display_duration = end_time - start_time
 
-        try:
-            unicode_name = f"U{hex(ord(emoji_char))[2:].upper()}"
-        except TypeError:
-            unicode_name = f"U{hex(ord(emoji_char[0]))[2:].upper()}"
+        emoji_path = emoji_index.lookup(emoji_char)
 
-        emoji_path = os.path.join(emoji_dir, f"{unicode_name}.png")
+        if emoji_path is None:
+            print(f"NOTICE: No emoji asset found for '{emoji_char}'")
 
-        if os.path.exists(emoji_path):
-            emoji_img = ImageClip(emoji_path)
-            target_height = int(video.h * relative_size)
-            emoji_img = emoji_img.resize(height=target_height)
+        else:
+            target_height = int(video_h * relative_size)
+            emoji_img = ImageClip(load_emoji_sprite(emoji_path, target_height))
 
-            center_x = (video.w - emoji_img.w) // 2
+            center_x = (video_w - emoji_img.w) // 2
 
             if display_duration >= min_duration_for_animation:
-                animation = get_animation(emoji_img, center_x)
-                emoji_img = (emoji_img
-                    .set_position(animation['position'])
-                    .resize(animation['scale'])
+                tracks = animation_tracks(
+                    random.choice(ANIMATIONS),
+                    int(np.ceil(display_duration * fps)) + 1,
+                    fps,
+                    center_x,
+                    vertical_position,
+                    emoji_img.size,
+                    animation_params,
+                )
+                emoji_img = (animated_sprite_clip(emoji_img.img, emoji_img.mask.img, tracks, fps, scale_levels)
                     .set_start(start_time)
                     .set_end(end_time))
             else:
@@ -119,8 +176,31 @@ def add_animated_emojis(
 
             emoji_clips.append(emoji_img)
 
-    final_video = CompositeVideoClip([video] + emoji_clips)
-    final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+    return emoji_clips
+
+def add_animated_emojis(
+    video_path,
+    emojis_timestamps,
+    output_path=None,
+    **kwargs
+):
+    """
+    Add animated emoji overlays to video based on timestamps
+
+    Parameters:
+    - video_path: path to input video
+    - emojis_timestamps: list of tuples (emoji_char, start_time)
+    - output_path: path for output video (optional)
+    - **kwargs: emoji options forwarded to create_emoji_clips
+    """
+    if output_path is None:
+        output_path = video_path.replace('.mp4', '_with_emojis.mp4')
+
+    video = VideoFileClip(video_path)
+    emoji_clips = create_emoji_clips(emojis_timestamps, video.size, video.duration, video.fps, **kwargs)
+
+    final_video = IntervalCompositeVideoClip([video] + emoji_clips)
+    write_videofile_streaming(final_video, output_path, codec='libx264', audio_codec='aac', logger=render_logger("emojis"))
 
     final_video.close()
     video.close()
@@ -1,10 +1,13 @@
 import os
+import re
+import time
+import random
 
 from typing import List
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from langchain_anthropic import ChatAnthropic
-from langchain.prompts import ChatPromptTemplate
+from ft_replay import cached_call
+from .emoji_picker import get_emoji_picker
 
 
 load_dotenv()
@@ -14,26 +17,155 @@ class SubtitleFormat(BaseModel):
     subtitles_segments: List[str] = Field(description="The segments of the voiceover. The list should only be a split of the complete voiceover, not a modification of it.")
     segment_smiley: List[str] = Field(description="The smiley for each segment. One smiley for each segment. (Apple color emoji)")
 
-model = ChatAnthropic(model='claude-3-5-sonnet-20241022')
-prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are a helpful assistant that split voiceover into segments for a video.
+REQUEST_TIMEOUT = 60
+MODEL = 'claude-3-5-sonnet-20241022'
+SYSTEM_PROMPT = """You are a helpful assistant that split voiceover into segments for a video.
      You take the voiceover of a tiktok video and split it into a list of segments.
      The list should only be a split of the complete voiceover, not a modification of it.
      The voiceover must be split into segments (not too long, max 10 words) to create good subtitles.
      You also return a list of smileys, one for each segment. The smileys should be the most appropriate smiley for the segment.
      The smileys should be in Apple color emoji format.
      The goal is to make the video more engaging and interesting for the viewer.
-     """),
-    ("user", "VOICEOVER: {voiceover}"),
-])
+     """
 
-chain = prompt | model.with_structured_output(SubtitleFormat)
+# Cost of ending a segment after a token, by what follows it
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*$")
+CLAUSE_END = re.compile(r"[,;:—–]+[\"')\]]*$")
+CONJUNCTIONS = {"and", "but", "so", "because", "which", "when", "while", "or", "then", "if", "until", "as"}
+PAUSE = 0.25  # seconds of silence between words that count as a natural break
+
+llm_chain = None
+
+def get_llm_chain():
+    """(prompt, model, chain) of the LLM formatter, built on first use so LangChain is only imported when needed"""
+    global llm_chain
+
+    if llm_chain is None:
+        from langchain_anthropic import ChatAnthropic
+        from langchain.prompts import ChatPromptTemplate
+
+        model = ChatAnthropic(model=MODEL, default_request_timeout=REQUEST_TIMEOUT)
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("user", "VOICEOVER: {voiceover}"),
+        ])
+        llm_chain = (prompt, model, prompt | model.with_structured_output(SubtitleFormat))
+
+    return llm_chain
+
+def break_costs(tokens, words=None):
+    """Cost of a segment break after each token: free at sentence ends, cheap at clauses and pauses"""
+    spoken = [i for i, token in enumerate(tokens) if re.search(r"\w", token)]
+    gaps = {}
+    if words is not None and len(words) == len(spoken):
+        for (i, word), next_word in zip(zip(spoken, words), words[1:]):
+            gaps[i] = next_word.start - word.end
+
+    costs = []
+    for i, token in enumerate(tokens):
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if SENTENCE_END.search(token):
+            cost = 0.0
+        elif CLAUSE_END.search(token) or token in ("-", "—", "–"):
+            cost = 0.3
+        elif next_token.lower() in CONJUNCTIONS:
+            cost = 0.6
+        else:
+            cost = 1.0
+
+        if gaps.get(i, 0.0) >= PAUSE:
+            cost = min(cost, 0.2)
+
+        costs.append(cost)
+    return costs
+
+def segment_tokens(tokens, costs, max_words=10, target_words=6):
+    """
+    Split tokens into segments of at most max_words spoken words, minimizing break costs plus
+    the distance of each segment length to target_words
+
+    Returns:
+        (start, end) token index pairs
+    """
+    n = len(tokens)
+    spoken = [0]
+    for token in tokens:
+        spoken.append(spoken[-1] + bool(re.search(r"\w", token)))
+
+    best = [0.0] + [float("inf")] * n
+    previous = [0] * (n + 1)
+
+    for end in range(1, n + 1):
+        # A punctuation-only token never starts a segment
+        if end < n and not re.search(r"\w", tokens[end]):
+            continue
+        break_cost = costs[end - 1] if end < n else 0.0
+
+        for start in range(end - 1, -1, -1):
+            length = spoken[end] - spoken[start]
+            if length > max_words:
+                break
+            if start > 0 and best[start] == float("inf"):
+                continue
+
+            cost = best[start] + break_cost + 0.03 * (length - target_words) ** 2
+            if length <= 1 and n > 1:
+                cost += 0.5
+            if cost < best[end]:
+                best[end] = cost
+                previous[end] = start
+
+    segments = []
+    end = n
+    while end > 0:
+        segments.append((previous[end], end))
+        end = previous[end]
+    return segments[::-1]
+
+def segment_voiceover(voiceover, max_words=10, emoji_dir="./emojis") -> SubtitleFormat:
+    """
+    Local, deterministic formatter: splits on punctuation and pauses with a word count cap,
+    then picks one emoji per segment among the assets of emoji_dir
+
+    voiceover is a text, or a transcription whose word timings then mark the pauses
+    """
+    text = " ".join(getattr(voiceover, "text", voiceover).split())
+    tokens = text.split()
+    if not tokens:
+        return SubtitleFormat(complete_voiceover=text, subtitles_segments=[], segment_smiley=[])
+
+    costs = break_costs(tokens, getattr(voiceover, "words", None))
+    segments = [" ".join(tokens[start:end]) for start, end in segment_tokens(tokens, costs, max_words)]
+
+    picker = get_emoji_picker(emoji_dir)
+    smileys = []
+    for segment in segments:
+        smileys.append(picker.pick(segment, previous=smileys[-1] if smileys else None))
+
+    return SubtitleFormat(complete_voiceover=text, subtitles_segments=segments, segment_smiley=smileys)
+
+def format_subtitles(voiceover: str, retries: int = 3, backoff: float = 1.0, use_llm: bool = False, max_words: int = 10, emoji_dir: str = "./emojis") -> SubtitleFormat:
+    """
+    Split the voiceover into subtitle segments with one smiley each, locally (see
+    segment_voiceover) unless use_llm is set.
+
+    With use_llm, each request times out after REQUEST_TIMEOUT seconds and failed attempts
+    are retried with exponential backoff.
+    """
+    if not use_llm:
+        return segment_voiceover(voiceover, max_words=max_words, emoji_dir=emoji_dir)
+
+    prompt, model, chain = get_llm_chain()
 
-def format_subtitles(voiceover: str, retries: int = 3) -> SubtitleFormat:
     for attempt in range(retries):
         try:
-            result = chain.invoke({"voiceover": voiceover})
-            return result
+            return cached_call(
+                "format_subtitles",
+                {"model": model.model, "prompt": prompt.format(voiceover=voiceover)},
+                lambda: chain.invoke({"voiceover": voiceover}),
+                encode=lambda result: result.model_dump(),
+                decode=SubtitleFormat.model_validate,
+            )
 
         except Exception as e:
             print(f"Attempt {attempt + 1} failed: {e}")
@@ -42,7 +174,9 @@ def format_subtitles(voiceover: str, retries: int = 3) -> SubtitleFormat:
                 raise
 
             else:
-                print("Retrying...")
+                delay = random.uniform(0, backoff * 2 ** attempt)
+                print(f"Retrying in {delay:.1f}s...")
+                time.sleep(delay)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+import numpy
+
+from PIL import Image, ImageColor, ImageDraw, ImageFilter, ImageFont
+from .disk_cache import cached_array
+
+
+font_cache = {}
+advance_cache = {}
+
+# Blur radius above which blur_rgba switches to downsample-blur-upsample
+FAST_BLUR_RADIUS = 8
+
+def load_font(font: str, fontsize: int) -> ImageFont.FreeTypeFont:
+    key = (font, fontsize)
+
+    if key not in font_cache:
+        font_cache[key] = ImageFont.truetype(font, fontsize)
+
+    return font_cache[key]
+
+def glyph_advance(char: str, font: str, fontsize: int) -> float:
+    key = (char, font, fontsize)
+
+    if key not in advance_cache:
+        advance_cache[key] = load_font(font, fontsize).getlength(char)
+
+    return advance_cache[key]
+
+def text_advance(text: str, font: str, fontsize: int) -> float:
+    """Width of a text laid out character by character, like text_drawer.create_composite_text"""
+    return sum(glyph_advance(char, font, fontsize) for char in text)
+
+def line_height(font: str, fontsize: int, stroke_width: int = 0) -> int:
+    """Height of a rasterized text line, its stroke above and below included"""
+    ascent, descent = load_font(font, fontsize).getmetrics()
+    return ascent + descent + 2 * stroke_width
+
+def parse_color(color, opacity: float = 1.0) -> tuple:
+    """Convert a color name, hex string or tuple to an RGBA tuple"""
+    if color is None or color == 'transparent':
+        return (0, 0, 0, 0)
+
+    if isinstance(color, str):
+        color = ImageColor.getcolor(color, "RGBA")
+    elif len(color) == 3:
+        color = (*color, 255)
+
+    return (*color[:3], int(round(color[3] * opacity)))
+
+def render_text(
+    text: str,
+    fontsize: int,
+    color: str,
+    font: str,
+    bg_color: str = 'transparent',
+    opacity: float = 1.0,
+    stroke_color: str | None = None,
+    stroke_width: int = 1,
+) -> numpy.ndarray:
+    """Rasterize a text (see rasterize_text), going through the on-disk sprite cache when enabled"""
+    params = {
+        "text": text,
+        "fontsize": fontsize,
+        "color": color,
+        "bg_color": bg_color,
+        "opacity": opacity,
+        "stroke_color": stroke_color,
+        "stroke_width": stroke_width,
+    }
+    return cached_array("text", font, params, lambda: rasterize_text(font=font, **params))
+
+def rasterize_text(
+    text: str,
+    fontsize: int,
+    color: str,
+    font: str,
+    bg_color: str = 'transparent',
+    opacity: float = 1.0,
+    stroke_color: str | None = None,
+    stroke_width: int = 1,
+) -> numpy.ndarray:
+    """
+    Rasterize a text with Pillow's FreeType bindings
+
+    Like ImageMagick's TextClip, the stroke is only drawn when a stroke color is given.
+    The text origin is at (stroke_width, stroke_width) and the height always covers the
+    font ascent and descent, so characters rendered separately line up on the same baseline.
+
+    Returns:
+        RGBA uint8 array of shape (height, width, 4)
+    """
+    pil_font = load_font(font, fontsize)
+    stroke_width = stroke_width if stroke_color is not None else 0
+
+    ascent, descent = pil_font.getmetrics()
+    right = max(pil_font.getlength(text), pil_font.getbbox(text)[2]) if text else 0
+    size = (max(1, int(numpy.ceil(right)) + stroke_width * 2), ascent + descent + stroke_width * 2)
+    origin = (stroke_width, stroke_width)
+
+    fill_mask = Image.new("L", size)
+    ImageDraw.Draw(fill_mask).text(origin, text, font=pil_font, fill=255)
+    fill_alpha = numpy.asarray(fill_mask, dtype=numpy.float32) / 255
+
+    fill_rgba = numpy.array(parse_color(color), dtype=numpy.float32)
+    bg_rgba = numpy.array(parse_color(bg_color), dtype=numpy.float32)
+
+    if stroke_width:
+        stroke_mask = Image.new("L", size)
+        ImageDraw.Draw(stroke_mask).text(origin, text, font=pil_font, fill=255, stroke_width=stroke_width, stroke_fill=255)
+        coverage = numpy.asarray(stroke_mask, dtype=numpy.float32) / 255
+        stroke_rgba = numpy.array(parse_color(stroke_color), dtype=numpy.float32)
+        ink = stroke_rgba + (fill_rgba - stroke_rgba) * fill_alpha[..., None]
+    else:
+        coverage = fill_alpha
+        ink = numpy.broadcast_to(fill_rgba, (size[1], size[0], 4))
+
+    # Blend the ink over the background with the glyph coverage
+    ink_alpha = ink[..., 3:] / 255 * coverage[..., None]
+    bg_alpha = bg_rgba[3] / 255 * (1 - ink_alpha)
+    alpha = ink_alpha + bg_alpha
+    rgb = (ink[..., :3] * ink_alpha + bg_rgba[:3] * bg_alpha) / numpy.maximum(alpha, 1e-6)
+
+    rgba = numpy.empty((size[1], size[0], 4), dtype=numpy.uint8)
+    rgba[..., :3] = numpy.clip(rgb, 0, 255)
+    rgba[..., 3] = numpy.clip(alpha[..., 0] * opacity * 255, 0, 255)
+
+    return rgba
+
+def render_runs(
+    runs: list[tuple],
+    fontsize: int,
+    color: str,
+    font: str,
+    stroke_color: str | None = None,
+    stroke_width: int = 1,
+) -> numpy.ndarray:
+    """
+    Rasterize consecutive text runs on a single canvas
+
+    Args:
+        runs: list of (text, color, fontsize) tuples, color and fontsize may be None to use the defaults
+
+    Returns:
+        RGBA uint8 array, runs are laid out left to right by advance width and top aligned
+    """
+    glyphs = []
+    offset_x = 0
+    for text, run_color, run_size in runs:
+        run_size = run_size or fontsize
+        glyphs.append((offset_x, render_text(text, run_size, run_color or color, font, stroke_color=stroke_color, stroke_width=stroke_width)))
+        offset_x += text_advance(text, font, run_size)
+
+    width = max(int(x) + glyph.shape[1] for x, glyph in glyphs)
+    height = max(glyph.shape[0] for _, glyph in glyphs)
+
+    canvas = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+    for x, glyph in glyphs:
+        alpha_composite(canvas, glyph, int(x), 0)
+
+    return canvas
+
+def render_shadow(text: str, fontsize: int, font: str, blur_radius: int, opacity: float = 1.0) -> numpy.ndarray:
+    """Render a blurred black copy of a text, padded and offset like text_drawer.blur_text_clip"""
+    params = {
+        "text": text,
+        "fontsize": fontsize,
+        "blur_radius": blur_radius,
+        "opacity": opacity,
+        "fast_blur_radius": FAST_BLUR_RADIUS,
+    }
+    return cached_array(
+        "shadow",
+        font,
+        params,
+        lambda: blur_padded(rasterize_text(text, fontsize, "black", font, opacity=opacity), blur_radius),
+    )
+
+def clip_to_rgba(clip, t: float = 0) -> numpy.ndarray:
+    """Read a clip frame and its mask into an RGBA uint8 array, without going through a file"""
+    frame = clip.get_frame(t)
+    mask = clip.mask.get_frame(t) if clip.mask is not None else numpy.ones(frame.shape[:2])
+
+    rgba = numpy.empty((*frame.shape[:2], 4), dtype=numpy.uint8)
+    rgba[..., :3] = numpy.clip(frame, 0, 255)
+    rgba[..., 3] = numpy.clip(mask * 255, 0, 255)
+
+    return rgba
+
+def pad_rgba(rgba: numpy.ndarray, left: int, top: int, right: int, bottom: int) -> numpy.ndarray:
+    return numpy.pad(rgba, ((top, bottom), (left, right), (0, 0)))
+
+def blur_padded(rgba: numpy.ndarray, blur_radius: int) -> numpy.ndarray:
+    """Pad a text bitmap with room for its blur, offset down-right so the shadow falls below the text, and blur it"""
+    offset = int(blur_radius * 0.6)
+    padded = pad_rgba(rgba, blur_radius + offset, blur_radius + offset, blur_radius * 2 - offset, blur_radius * 2 - offset)
+
+    return blur_rgba(padded, blur_radius)
+
+def blur_rgba(rgba: numpy.ndarray, radius: float, fast: bool = True) -> numpy.ndarray:
+    """
+    Gaussian blur of an RGBA array
+
+    Pillow's GaussianBlur runs as separable horizontal and vertical passes. When fast is set and
+    the radius is above FAST_BLUR_RADIUS, the image is downsampled first, blurred with a
+    proportionally smaller radius and upsampled back, which is visually equivalent for soft
+    shadows and costs a fraction of the full resolution blur.
+    """
+    if radius <= 0:
+        return rgba
+
+    img = Image.fromarray(rgba)
+    factor = int(numpy.ceil(radius / FAST_BLUR_RADIUS)) if fast else 1
+
+    if factor > 1:
+        small = img.reduce(factor)
+        small = small.filter(ImageFilter.GaussianBlur(radius=radius / factor))
+        img = small.resize(img.size, Image.BILINEAR)
+    else:
+        img = img.filter(ImageFilter.GaussianBlur(radius=radius))
+
+    return numpy.asarray(img)
+
+def alpha_composite(dst: numpy.ndarray, src: numpy.ndarray, x: int, y: int):
+    """Composite the RGBA array src over dst in place, with its top-left corner at (x, y)"""
+    h, w = src.shape[:2]
+    region = Image.fromarray(dst[y:y + h, x:x + w])
+    region.alpha_composite(Image.fromarray(src))
+    dst[y:y + h, x:x + w] = numpy.asarray(region)
@@ -1,90 +1,137 @@
-from moviepy.editor import VideoFileClip, CompositeVideoClip
+import numpy
+
+from moviepy.editor import VideoFileClip, ImageClip
+from ft_metrics import render_logger
+from ft_streaming import write_videofile_streaming
 from .text_drawer import (
-    get_text_size_ex,
     create_text_ex,
     blur_text_clip,
     Word,
 )
+from .raster import render_runs, render_shadow, alpha_composite, text_advance, line_height
+from .cache import RenderCache
+from .compositor import IntervalCompositeVideoClip
 
 
-lines_cache = {}
-shadow_cache = {}
+lines_cache = RenderCache("lines", max_entries=1024)
+shadow_cache = RenderCache("shadow", max_entries=256, max_bytes=256 * 1024 * 1024)
+sprite_cache = RenderCache("sprite", max_entries=1024, max_bytes=512 * 1024 * 1024)
 
 def calculate_lines(text, font, font_size, stroke_width, frame_width):
-    global lines_cache
+    """
+    Break a text into lines that fit in frame_width
 
-    arg_hash = hash((text, font, font_size, stroke_width, frame_width))
+    Widths are accumulated word by word from cached glyph advances plus the stroke on
+    both sides, so nothing is rasterized and each word is measured once. Line heights
+    include the stroke too, as the rendered text clips do.
+    """
+    key = (text, font, font_size, stroke_width, frame_width)
 
-    if arg_hash in lines_cache:
-        return lines_cache[arg_hash]
+    cached = lines_cache.get(key)
+    if cached is not None:
+        return cached
 
     lines = []
-
-    line_to_draw = None
-    line = ""
-    words = text.split()
-    word_index = 0
-    total_height = 0
-    while word_index < len(words):
-        word = words[word_index]
-        line += word + " "
-        text_size = get_text_size_ex(line.strip(), font, font_size, stroke_width)
-        text_width = text_size[0]
-        line_height = text_size[1]
-
-        if text_width < frame_width:
-            line_to_draw = {
-                "text": line.strip(),
-                "height": line_height,
-            }
-            word_index += 1
+    height = line_height(font, font_size, stroke_width)
+    space_width = text_advance(" ", font, font_size)
+    stroke = stroke_width * 2
+
+    line_words = []
+    line_width = 0
+    for word in text.split():
+        word_width = text_advance(word, font, font_size)
+
+        if line_words and line_width + space_width + word_width + stroke >= frame_width:
+            lines.append({
+                "text": " ".join(line_words),
+                "height": height,
+            })
+            line_words = []
+            line_width = 0
+
+        if not line_words:
+            if word_width + stroke >= frame_width:
+                print(f"NOTICE: Word '{word}' is too long for the frame!")
+            line_words.append(word)
+            line_width = word_width
         else:
-            if not line_to_draw:
-                print(f"NOTICE: Word '{line.strip()}' is too long for the frame!")
-                line_to_draw = {
-                    "text": line.strip(),
-                    "height": line_height,
-                }
-                word_index += 1
-
-            lines.append(line_to_draw)
-            total_height += line_height
-            line_to_draw = None
-            line = ""
-
-    if line_to_draw:
-        lines.append(line_to_draw)
-        total_height += line_height
+            line_words.append(word)
+            line_width += space_width + word_width
+
+    if line_words:
+        lines.append({
+            "text": " ".join(line_words),
+            "height": height,
+        })
 
     data = {
         "lines": lines,
-        "height": total_height,
+        "height": height * len(lines),
     }
 
-    lines_cache[arg_hash] = data
+    lines_cache.put(key, data)
 
     return data
 
 def create_shadow(text: str, font_size: int, font: str, blur_radius: float, opacity: float=1.0):
-    global shadow_cache
+    key = (text, font_size, font, blur_radius, opacity)
 
-    arg_hash = hash((text, font_size, font, blur_radius, opacity))
-
-    if arg_hash in shadow_cache:
-        return shadow_cache[arg_hash].copy()
+    cached = shadow_cache.get(key)
+    if cached is not None:
+        return cached.copy()
 
     shadow = create_text_ex(text, font_size, "black", font, opacity=opacity)
     shadow = blur_text_clip(shadow, int(font_size*blur_radius))
 
-    shadow_cache[arg_hash] = shadow.copy()
+    shadow_cache.put(key, shadow.copy())
 
     return shadow
 
-def write_subtitles(font, font_size, stroke_width, stroke_color, shadow_blur, font_color, word_highlight_color, padding, highlight_current_word, increase_font_size, captions, tmp_tiktok, final_output, vertical_position_offset=0):
-    # Open the video file
-    video = VideoFileClip(tmp_tiktok)
-    text_bbox_width = video.w-padding*2
-    clips = [video]
+def create_caption_sprite(line_text: str, words: list[Word], font_size: int, font: str, font_color: str, stroke_color: str, stroke_width: int, shadow_blur: float):
+    """
+    Flatten the shadow and the styled text of a caption line into a single RGBA sprite
+
+    Returns:
+        (sprite, text_width, text_offset) where text_offset is the (x, y) position of the
+        text's top-left corner inside the sprite
+    """
+    runs = []
+    for i, word in enumerate(words):
+        text = word.word + " " if i < len(words) - 1 else word.word
+        runs.append((text, word.color, word.size))
+
+    key = (line_text, tuple(runs), font_size, font, font_color, stroke_color, stroke_width, shadow_blur)
+
+    cached = sprite_cache.get(key)
+    if cached is not None:
+        return cached
+
+    text = render_runs(runs, font_size, font_color, font, stroke_color=stroke_color, stroke_width=stroke_width)
+    shadow = render_shadow(line_text, font_size, font, int(font_size*shadow_blur))
+
+    # Both layers are centered on the frame independently, shadow stays top aligned with the text
+    text_h, text_w = text.shape[:2]
+    shadow_h, shadow_w = shadow.shape[:2]
+    shadow_x = (text_w - shadow_w) // 2
+
+    left = min(0, shadow_x)
+    width = max(text_w, shadow_x + shadow_w) - left
+    height = max(text_h, shadow_h)
+
+    sprite = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+    alpha_composite(sprite, shadow, shadow_x - left, 0)
+    alpha_composite(sprite, text, -left, 0)
+
+    data = (ImageClip(sprite), text_w, (-left, 0))
+
+    sprite_cache.put(key, data)
+
+    return data
+
+def create_subtitle_clips(font, font_size, stroke_width, stroke_color, shadow_blur, font_color, word_highlight_color, padding, highlight_current_word, increase_font_size, captions, video_size, vertical_position_offset=0, flatten_sprites=False):
+    video_w, video_h = video_size
+    text_bbox_width = video_w-padding*2
+    clips = []
 
     for caption in captions:
         captions_to_draw = []
@@ -106,7 +153,7 @@ def write_subtitles(font, font_size, stroke_width, stroke_color, shadow_blur, fo
         for current_index, caption in enumerate(captions_to_draw):
             line_data = calculate_lines(caption["text"], font, font_size, stroke_width, text_bbox_width)
 
-            text_y_offset = video.h // 2 - line_data["height"] // 2 + vertical_position_offset
+            text_y_offset = video_h // 2 - line_data["height"] // 2 + vertical_position_offset
             index = 0
             for line in line_data["lines"]:
                 pos = ("center", text_y_offset)
@@ -121,6 +168,16 @@ def write_subtitles(font, font_size, stroke_width, stroke_color, shadow_blur, fo
                     index += 1
                     word_list.append(word_obj)
 
+                if flatten_sprites:
+                    sprite, text_w, (offset_x, offset_y) = create_caption_sprite(line["text"], word_list, font_size, font, font_color, stroke_color, stroke_width, shadow_blur)
+                    sprite = sprite.set_start(caption["start"])
+                    sprite = sprite.set_duration(caption["end"] - caption["start"])
+                    sprite = sprite.set_position((int((video_w - text_w) / 2) - offset_x, text_y_offset - offset_y))
+                    clips.append(sprite)
+
+                    text_y_offset += line["height"]
+                    continue
+
                 # Create shadow
                 shadow_left = 1.0
                 while shadow_left >= 1:
@@ -147,11 +204,34 @@ def write_subtitles(font, font_size, stroke_width, stroke_color, shadow_blur, fo
 
                 text_y_offset += line["height"]
 
+    return clips
+
+def write_subtitles(font, font_size, stroke_width, stroke_color, shadow_blur, font_color, word_highlight_color, padding, highlight_current_word, increase_font_size, captions, tmp_tiktok, final_output, vertical_position_offset=0, flatten_sprites=False):
+    # Open the video file
+    video = VideoFileClip(tmp_tiktok)
+    clips = [video] + create_subtitle_clips(
+        font=font,
+        font_size=font_size,
+        stroke_width=stroke_width,
+        stroke_color=stroke_color,
+        shadow_blur=shadow_blur,
+        font_color=font_color,
+        word_highlight_color=word_highlight_color,
+        padding=padding,
+        highlight_current_word=highlight_current_word,
+        increase_font_size=increase_font_size,
+        captions=captions,
+        video_size=video.size,
+        vertical_position_offset=vertical_position_offset,
+        flatten_sprites=flatten_sprites,
+    )
 
-    video_with_text = CompositeVideoClip(clips)
+    video_with_text = IntervalCompositeVideoClip(clips)
 
-    video_with_text.write_videofile(
-        filename=final_output,
+    write_videofile_streaming(
+        video_with_text,
+        final_output,
         codec="libx264",
-        fps=video.fps
+        fps=video.fps,
+        logger=render_logger("subtitles"),
     )
@@ -1,11 +1,20 @@
-import numpy
-import tempfile
-
-from PIL import Image, ImageFilter, ImageFont
 from moviepy.editor import TextClip, ImageClip, VideoClip, CompositeVideoClip
+from .raster import render_text, text_advance, blur_padded, clip_to_rgba
+from .cache import RenderCache
+
+
+text_cache = RenderCache("text", max_entries=4096, max_bytes=256 * 1024 * 1024)
+
+# "pillow" rasterizes in-process with FreeType, "imagemagick" uses moviepy's TextClip
+TEXT_BACKEND = "pillow"
 
+def set_text_backend(backend: str):
+    global TEXT_BACKEND
 
-text_cache = {}
+    if backend not in ("pillow", "imagemagick"):
+        raise ValueError(f"Unknown text backend: {backend}")
+
+    TEXT_BACKEND = backend
 
 class Character:
     def __init__(self, text, color=None):
@@ -38,11 +47,10 @@ class TextClipEx(TextClip):
         super().__init__(**kwargs)
         self.text = kwargs["txt"]
 
-def moviepy_to_pillow(clip) -> Image:
-    temp_file = tempfile.NamedTemporaryFile(suffix=".png").name
-    clip.save_frame(temp_file)
-    image = Image.open(temp_file)
-    return image
+class GlyphClip(ImageClip):
+    def __init__(self, text, **kwargs):
+        super().__init__(render_text(text, **kwargs))
+        self.text = text
 
 def get_text_size(text, fontsize, font, stroke_width):
     text_clip = create_text(text, fontsize=fontsize, color="white", font=font, stroke_width=stroke_width)
@@ -53,22 +61,8 @@ def get_text_size_ex(text, font, fontsize, stroke_width):
     return text_clip.size
 
 def blur_text_clip(text_clip, blur_radius: int) -> VideoClip:
-    # Convert TextClip to a PIL image
-    pil_img = moviepy_to_pillow(text_clip)
-
-    # Offset blur to make it centered
-    offset = int(blur_radius * 0.6)
-
-    # Add empty space around text for blur
-    pil_img_padded = Image.new("RGBA", (pil_img.width + blur_radius * 3, pil_img.height + blur_radius * 3))
-    pil_img_padded.paste(moviepy_to_pillow(text_clip), (blur_radius+offset, blur_radius+offset))
-
-    # Create a blurred version of the text
-    pil_img_padded = pil_img_padded.filter(
-        ImageFilter.GaussianBlur(radius=blur_radius)
-    )
-
-    text_clip = ImageClip(numpy.array(pil_img_padded))
+    # Blur the clip's first frame in memory, with empty space around the text for the blur
+    text_clip = ImageClip(blur_padded(clip_to_rgba(text_clip), blur_radius))
     text_clip = text_clip.set_duration(text_clip.duration)
 
     return text_clip
@@ -85,21 +79,26 @@ def create_text(
     stroke_width: int = 1,
     kerning: float = 0.0,
 ) -> VideoClip:
-    global text_cache
-
-    arg_hash = hash((text, fontsize, color, font, bg_color, blur_radius, opacity, stroke_color, stroke_width, kerning))
+    key = (TEXT_BACKEND, text, fontsize, color, font, bg_color, blur_radius, opacity, stroke_color, stroke_width, kerning)
 
-    if arg_hash in text_cache:
-        return text_cache[arg_hash].copy()
+    cached = text_cache.get(key)
+    if cached is not None:
+        return cached.copy()
 
-    text_clip = TextClipEx(txt=text, fontsize=fontsize, color=color, bg_color=bg_color, font=font, stroke_color=stroke_color, stroke_width=stroke_width, kerning=kerning)
-
-    text_clip = text_clip.set_opacity(opacity)
+    if TEXT_BACKEND == "pillow":
+        text_clip = GlyphClip(text, fontsize=fontsize, color=color, font=font, bg_color=bg_color, opacity=opacity, stroke_color=stroke_color, stroke_width=stroke_width)
+    else:
+        text_clip = TextClipEx(txt=text, fontsize=fontsize, color=color, bg_color=bg_color, font=font, stroke_color=stroke_color, stroke_width=stroke_width, kerning=kerning)
+        text_clip = text_clip.set_opacity(opacity)
 
     if blur_radius:
         text_clip = blur_text_clip(text_clip, blur_radius)
 
-    text_cache[arg_hash] = text_clip.copy()
+    # Used by create_composite_text to place the character
+    text_clip.text = text
+    text_clip.fontsize = fontsize
+
+    text_cache.put(key, text_clip.copy())
 
     return text_clip
 
@@ -132,16 +131,13 @@ def create_text_chars(
 
     return clips
 
-def create_composite_text(text_clips: list[VideoClip], font, font_size) -> CompositeVideoClip:
+def create_composite_text(text_clips: list[VideoClip], font) -> CompositeVideoClip:
     clips = []
 
-    font = ImageFont.truetype(font, font_size)
-    scale_factor = 3.012 # factor to convert Pillow to MoviePy width
-
+    # Characters are placed by their font advance, the last one keeps its full rendered width
     full_width = 0
     for clip in text_clips[:-1]:
-        width = font.getlength(clip.text) * scale_factor
-        full_width += width
+        full_width += text_advance(clip.text, font, clip.fontsize)
 
     full_width += text_clips[-1].size[0]
     offset_x = 0
@@ -149,8 +145,7 @@ def create_composite_text(text_clips: list[VideoClip], font, font_size) -> Compo
     for clip in text_clips:
         clip.size = (int(full_width), clip.size[1])
         clip = clip.set_position((int(offset_x), 0))
-        width = font.getlength(clip.text)
-        offset_x += width * scale_factor
+        offset_x += text_advance(clip.text, font, clip.fontsize)
         clips.append(clip)
 
     return CompositeVideoClip(clips)
@@ -173,4 +168,4 @@ def create_text_ex(
     if isinstance(text, str):
         text = str_to_charlist(text)
     text_clips = create_text_chars(text, fontsize, color, font, bg_color, blur_radius, opacity, stroke_color, stroke_width)
-    return create_composite_text(text_clips, font, fontsize // 3)
+    return create_composite_text(text_clips, font)
@@ -0,0 +1,162 @@
+"""
+Local subtitle segmentation (subtitles.format_subtitles) and word alignment (ft_utils)
+
+Usage: python -m pytest tests
+"""
+import os
+import re
+import sys
+
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ft_utils import match_words, get_segment_timestamps
+from subtitles.format_subtitles import SubtitleFormat, break_costs, segment_tokens, segment_voiceover
+
+
+SCRIPT = (
+    "Octopuses have THREE hearts! Two pump blood to the gills, one to the body. "
+    "And when they swim, the main heart stops beating. That's why they prefer crawling!"
+)
+EMOJI_DIR = os.path.join(ROOT, "emojis")
+
+def spoken(text):
+    return len([token for token in text.split() if re.search(r"\w", token)])
+
+def transcription(words, duration=None):
+    """Whisper-like transcription: words timed 0.5s apart, 0.4s long"""
+    timed = [SimpleNamespace(word=word, start=0.5 * i, end=0.5 * i + 0.4) for i, word in enumerate(words)]
+    return SimpleNamespace(
+        text=" ".join(words),
+        words=timed,
+        duration=duration if duration is not None else 0.5 * len(words),
+    )
+
+def segments(*texts):
+    return SubtitleFormat(complete_voiceover=" ".join(texts), subtitles_segments=list(texts), segment_smiley=["🙂"] * len(texts))
+
+# segment_tokens / segment_voiceover
+
+@pytest.mark.parametrize("max_words", [3, 6, 10])
+def test_segments_respect_the_word_cap_and_cover_the_text(max_words):
+    tokens = SCRIPT.split()
+    ranges = segment_tokens(tokens, break_costs(tokens), max_words=max_words)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(tokens)
+    for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+    for start, end in ranges:
+        assert 1 <= spoken(" ".join(tokens[start:end])) <= max_words
+
+def test_segments_break_at_sentence_ends():
+    result = segment_voiceover(SCRIPT, emoji_dir=EMOJI_DIR)
+
+    assert " ".join(result.subtitles_segments) == SCRIPT
+    for sentence_end in ["hearts!", "body.", "beating.", "crawling!"]:
+        assert any(segment.endswith(sentence_end) for segment in result.subtitles_segments)
+    assert len(result.segment_smiley) == len(result.subtitles_segments)
+
+def test_segments_prefer_clause_breaks():
+    text = "Two pump blood to the gills, one to the body and the brain"
+    result = segment_voiceover(text, max_words=8, emoji_dir=EMOJI_DIR)
+    assert result.subtitles_segments[0] == "Two pump blood to the gills,"
+
+def test_punctuation_token_never_starts_a_segment():
+    text = "The main heart stops beating - that is why they prefer crawling over swimming in the sea"
+    tokens = text.split()
+    ranges = segment_tokens(tokens, break_costs(tokens), max_words=6)
+    for start, _ in ranges:
+        assert re.search(r"\w", tokens[start])
+
+def test_pauses_mark_breaks():
+    words = "one two three four five six seven eight nine ten".split()
+    timed = [SimpleNamespace(word=w, start=float(i), end=i + 0.9) for i, w in enumerate(words)]
+    timed[3:] = [SimpleNamespace(word=w.word, start=w.start + 1.0, end=w.end + 1.0) for w in timed[3:]]
+
+    costs = break_costs(words, timed)
+    assert costs[2] < costs[1] and costs[2] < costs[3]
+
+def test_empty_voiceover():
+    result = segment_voiceover("   ", emoji_dir=EMOJI_DIR)
+    assert result.subtitles_segments == [] and result.segment_smiley == []
+
+# match_words
+
+def test_match_equal_words():
+    mapping, exact = match_words(["a", "b", "c"], ["a", "b", "c"])
+    assert mapping == [0, 1, 2] and exact == [True] * 3
+
+def test_match_substituted_word():
+    mapping, exact = match_words(["the", "octopus", "swims", "fast"], ["the", "octopush", "swims", "fast"])
+    assert mapping == [0, 1, 2, 3]
+    assert exact == [True, False, True, True]
+
+def test_match_deleted_word():
+    # "main" was not transcribed
+    mapping, exact = match_words(["the", "main", "heart", "stops"], ["the", "heart", "stops"])
+    assert mapping == [0, None, 1, 2]
+    assert exact == [True, False, True, True]
+
+def test_match_inserted_word():
+    # "um" was transcribed but is not in the script
+    mapping, exact = match_words(["the", "heart", "stops"], ["the", "um", "heart", "stops"])
+    assert mapping == [0, 2, 3]
+    assert exact == [True, True, True]
+
+def test_match_split_words():
+    mapping, _ = match_words(["over", "3000", "hearts"], ["over", "3", "000", "hearts"])
+    assert mapping == [0, 1, 3]
+    mapping, _ = match_words(["every", "one", "counts"], ["everyone", "counts"])
+    assert mapping == [0, 0, 1]
+
+def test_match_against_nothing():
+    assert match_words(["a", "b"], []) == ([None, None], [False, False])
+
+# get_segment_timestamps
+
+def test_timestamps_of_matching_words():
+    result = get_segment_timestamps(transcription(["Octopuses", "have", "three", "hearts"]), segments("Octopuses have", "THREE hearts!"))
+
+    assert [s["start_time"] for s in result] == [0.0, 1.0]
+    assert [s["end_time"] for s in result] == [0.9, 1.9]
+    assert [w["word"] for w in result[1]["words"]] == ["THREE", "hearts!"]
+    assert all(s["unmatched"] == [] for s in result)
+
+def test_unmatched_words_are_listed_and_interpolated():
+    result = get_segment_timestamps(
+        transcription(["the", "heart", "stops", "beating"]),
+        segments("the main heart", "stops beating"),
+    )
+
+    assert result[0]["unmatched"] == ["main"]
+    main = result[0]["words"][1]
+    assert 0.4 <= main["start_time"] < main["end_time"] <= 0.5
+    assert result[1]["unmatched"] == []
+
+def test_substituted_words_take_the_time_of_their_transcription():
+    result = get_segment_timestamps(transcription(["the", "octopush", "swims"]), segments("the octopus swims"))
+
+    octopus = result[0]["words"][1]
+    assert (octopus["start_time"], octopus["end_time"]) == (0.5, 0.9)
+    assert result[0]["unmatched"] == ["octopus"]
+
+def test_empty_transcription_spreads_words_over_the_duration():
+    result = get_segment_timestamps(transcription([], duration=4.0), segments("one two", "three four"))
+
+    assert len(result) == 2
+    assert result[0]["start_time"] == 0.0
+    assert result[1]["end_time"] == pytest.approx(4.0)
+    assert result[0]["unmatched"] == ["one", "two"]
+    times = [w["start_time"] for s in result for w in s["words"]]
+    assert times == sorted(times)
+
+def test_punctuation_only_words_are_not_unmatched():
+    result = get_segment_timestamps(transcription(["it", "stops", "then", "starts"]), segments("it stops -", "then starts"))
+
+    assert result[0]["unmatched"] == []
+    dash = result[0]["words"][2]
+    assert 0.9 <= dash["start_time"] <= dash["end_time"] <= 1.0
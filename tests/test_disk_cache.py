@@ -0,0 +1,51 @@
+"""
+Size cap and eviction of subtitles.disk_cache
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+import subprocess
+
+import numpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from subtitles.disk_cache import SpriteDiskCache
+
+
+def sprite(value):
+    return numpy.full((64, 64, 4), value, dtype=numpy.uint8)
+
+def test_evicts_least_recently_used(tmp_path):
+    size = sprite(0).nbytes + 128  # array plus the .npy header
+    cache = SpriteDiskCache(str(tmp_path), max_bytes=3 * size)
+
+    for i in range(3):
+        cache.save(f"{i:02d}key", sprite(i))
+        os.utime(cache.path(f"{i:02d}key"), (1000 + i, 1000 + i))
+    assert cache.evictions == 0
+
+    assert cache.load("00key") is not None  # a hit makes it the most recent
+    cache.save("03key", sprite(3))
+
+    assert cache.bytes <= 3 * size
+    assert cache.evictions > 0
+    assert not os.path.exists(cache.path("01key"))
+    assert os.path.exists(cache.path("00key"))
+    assert os.path.exists(cache.path("03key"))
+    assert cache.load("01key") is None
+
+def test_counts_existing_files(tmp_path):
+    first = SpriteDiskCache(str(tmp_path))
+    first.save("aakey", sprite(1))
+
+    second = SpriteDiskCache(str(tmp_path))
+    assert second.bytes == os.path.getsize(second.path("aakey"))
+
+def test_import_leaves_cache_disabled(tmp_path):
+    env = dict(os.environ, SPRITE_CACHE_DIR=str(tmp_path))
+    code = "import subtitles.disk_cache as d; print(d.disk_cache is None)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "True"
@@ -0,0 +1,87 @@
+"""
+Range downloads of footage against a local server with Range support (benchmarks/fixtures.py)
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fixtures
+
+from ft_utils import download_footage_range, media_duration, read_packets
+from ft_footage import FootageStore, video_id_from_url
+
+
+SOURCE_SECONDS = 60
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """(url, path) of a 60s video with a keyframe every second, served with Range support"""
+    root = str(tmp_path_factory.mktemp("srv"))
+    path = fixtures.make_gameplay(os.path.join(root, "gameplay.mp4"), duration=SOURCE_SECONDS, size="640x360", gop=30)
+    server, base_url = fixtures.serve_files(root)
+    yield f"{base_url}/gameplay.mp4", path
+    server.shutdown()
+
+def test_range_lasts_duration_plus_margin(source, tmp_path):
+    url, path = source
+    output_path = str(tmp_path / "range.mp4")
+
+    # 20.5 is between keyframes: the range starts on the one before
+    stats = download_footage_range(url, output_path, 7, start=20.5, margin=2.0)
+
+    assert stats["start"] == pytest.approx(20.0, abs=0.01)
+    assert media_duration(output_path) == pytest.approx(9.0, abs=0.25)
+    assert stats["end"] - stats["start"] == pytest.approx(9.0, abs=0.25)
+    packets, _, _ = read_packets(output_path)
+    assert packets[0]["key"]
+
+    source_bytes = os.path.getsize(path)
+    assert stats["source_bytes"] == source_bytes
+    assert 0 < stats["bytes_used"] < stats["bytes_fetched"] < source_bytes / 2
+
+def test_store_caches_a_max_seconds_window(source, tmp_path):
+    url, _ = source
+    store = FootageStore(str(tmp_path / "footage"), max_seconds=30, range_margin=2.0)
+    video_id = video_id_from_url(url)
+
+    path = store.download(url)
+    entry = store.read_index()[video_id]
+    assert entry["range"][1] - entry["range"][0] == pytest.approx(30.0, abs=0.25)
+    assert media_duration(path) == pytest.approx(30.0, abs=0.25)
+
+    # A window too short for a longer duration is downloaded again
+    assert store.verify(video_id, duration=20)
+    assert not store.verify(video_id, duration=40)
+    store.pick([url], duration=40)
+    entry = store.read_index()[video_id]
+    assert entry["range"][1] - entry["range"][0] == pytest.approx(42.0, abs=0.25)
+
+def test_cached_picks_vary_their_segment(source, tmp_path):
+    url, _ = source
+    store = FootageStore(str(tmp_path / "footage"), max_seconds=30)
+
+    # Every pick after the first is served from the cache, from random keyframes of the window
+    starts = set()
+    for _ in range(10):
+        video_id = store.pick_mezzanine([url])
+        starts.add(store.segment_start(video_id, 5))
+
+    assert len(store.read_index()) == 1
+    assert len(starts) > 1
+    assert all(start + 5 <= store.ingest(video_id)["duration"] for start in starts)
+
+def test_segment_start_extends_a_short_window(source, tmp_path):
+    url, _ = source
+    store = FootageStore(str(tmp_path / "footage"), max_seconds=10, range_margin=2.0)
+
+    video_id = store.pick_mezzanine([url])
+    start = store.segment_start(video_id, 20)
+
+    assert store.ingest(video_id)["duration"] >= 20
+    assert start + 20 <= store.ingest(video_id)["duration"]
@@ -0,0 +1,173 @@
+"""
+Scheduling of ft_pipeline.Pipeline: dependencies, retries, timeouts and the critical path
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ft_pipeline import Pipeline
+
+
+def test_dependencies_results_and_inputs():
+    pipeline = Pipeline()
+
+    @pipeline.stage(inputs=["topic"])
+    def content(topic):
+        return f"script about {topic}"
+
+    @pipeline.stage(deps=["content"])
+    def tts(content):
+        return content.upper()
+
+    @pipeline.stage(deps=["content", "tts"])
+    def render(content, tts):
+        return (content, tts)
+
+    results = pipeline.run(topic="octopuses")
+    assert results["render"] == ("script about octopuses", "SCRIPT ABOUT OCTOPUSES")
+
+def test_independent_stages_overlap():
+    pipeline = Pipeline()
+    running = []
+    overlapped = threading.Event()
+
+    def work():
+        running.append(1)
+        if len(running) == 2:
+            overlapped.set()
+        overlapped.wait(2)
+        return overlapped.is_set()
+
+    pipeline.add("a", work)
+    pipeline.add("b", work)
+    assert pipeline.run() == {"a": True, "b": True}
+
+def test_failed_attempts_are_retried():
+    pipeline = Pipeline()
+    calls = []
+
+    @pipeline.stage(retries=2, backoff=0.01)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("busy")
+        return "done"
+
+    assert pipeline.run()["flaky"] == "done"
+    attempts = pipeline.timeline()[0]["attempts"]
+    assert [attempt["error"] for attempt in attempts] == ["busy", "busy", None]
+    assert pipeline.timeline()[0]["status"] == "ok"
+
+def test_failure_after_the_last_retry():
+    pipeline = Pipeline()
+
+    @pipeline.stage(retries=1, backoff=0.01)
+    def broken():
+        raise ValueError("no quota")
+
+    @pipeline.stage(deps=["broken"])
+    def after(broken):
+        return broken
+
+    with pytest.raises(Exception, match="Stage broken failed: no quota"):
+        pipeline.run()
+    assert len(pipeline.timeline()[0]["attempts"]) == 2
+    assert "after" not in pipeline.records
+
+def test_timed_out_attempts_are_retried():
+    pipeline = Pipeline()
+    calls = []
+
+    @pipeline.stage(timeout=0.2, retries=1, backoff=0.01)
+    def slow_once():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return len(calls)
+
+    assert pipeline.run()["slow_once"] == 2
+    assert [attempt["error"] for attempt in pipeline.timeline()[0]["attempts"]] == ["timed out", None]
+
+def test_timeouts_not_retried_when_disabled():
+    pipeline = Pipeline()
+    calls = []
+
+    @pipeline.stage(timeout=0.2, retries=3, backoff=0.01, retry_timeouts=False)
+    def slow():
+        calls.append(1)
+        time.sleep(0.5)
+
+    with pytest.raises(Exception, match="timed out"):
+        pipeline.run()
+    assert len(calls) == 1
+
+def test_run_waits_for_abandoned_attempts():
+    pipeline = Pipeline()
+    finished = threading.Event()
+
+    @pipeline.stage(timeout=0.1, retry_timeouts=False)
+    def slow():
+        time.sleep(0.5)
+        finished.set()
+
+    with pytest.raises(Exception, match="timed out"):
+        pipeline.run()
+    assert finished.is_set()
+
+def test_run_waits_for_other_stages_when_one_fails():
+    pipeline = Pipeline()
+    started = threading.Event()
+    finished = threading.Event()
+
+    @pipeline.stage()
+    def broken():
+        started.wait(2)
+        raise ValueError("boom")
+
+    @pipeline.stage()
+    def slow():
+        started.set()
+        time.sleep(0.5)
+        finished.set()
+
+    with pytest.raises(Exception, match="boom"):
+        pipeline.run()
+    assert finished.is_set()
+
+def test_critical_path_follows_the_last_finished_dependency():
+    pipeline = Pipeline()
+
+    @pipeline.stage()
+    def content():
+        time.sleep(0.1)
+
+    @pipeline.stage()
+    def footage():
+        time.sleep(0.4)
+
+    @pipeline.stage(deps=["content"])
+    def tts(content):
+        time.sleep(0.1)
+
+    @pipeline.stage(deps=["tts", "footage"])
+    def render(tts, footage):
+        pass
+
+    pipeline.run()
+    assert pipeline.critical_path() == ["footage", "render"]
+
+    timeline = {t["stage"]: t for t in pipeline.timeline()}
+    assert timeline["render"]["start"] >= timeline["footage"]["end"]
+    assert timeline["tts"]["start"] >= timeline["content"]["end"]
+
+def test_unknown_dependency():
+    pipeline = Pipeline()
+    with pytest.raises(Exception, match="unknown stage"):
+        pipeline.add("render", lambda footage: None, deps=["footage"])
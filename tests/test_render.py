@@ -0,0 +1,60 @@
+"""
+Chunking of ft_render.render_tiktok_chunked: GOP-aligned ranges covering every frame once
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from ft_render import chunk_ranges, gop_params
+from ft_footage import probe_keyframes
+
+
+@pytest.mark.parametrize("n_frames, gop, chunks", [
+    (296, 30, 2),
+    (296, 30, 3),
+    (300, 30, 4),
+    (30, 30, 4),
+    (31, 30, 4),
+    (1, 30, 2),
+    (1000, 25, 7),
+    (90, 1, 8),
+])
+def test_chunks_are_gop_aligned_and_cover_every_frame_once(n_frames, gop, chunks):
+    ranges = chunk_ranges(n_frames, gop, chunks)
+
+    assert 1 <= len(ranges) <= chunks
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == n_frames
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+    for start, end in ranges:
+        assert start % gop == 0
+        assert end > start
+
+    frames = [frame for start, end in ranges for frame in range(start, end)]
+    assert frames == list(range(n_frames))
+
+def test_chunks_are_balanced():
+    sizes = [end - start for start, end in chunk_ranges(600, 30, 4)]
+    assert max(sizes) - min(sizes) <= 30
+
+def test_gop_params_put_keyframes_on_the_chunk_grid(tmp_path):
+    gop, fps, n_frames = 10, 30, 65
+    path = str(tmp_path / "chunk.mp4")
+
+    writer = FFMPEG_VideoWriter(path, (64, 64), fps, codec="libx264", ffmpeg_params=gop_params(gop))
+    try:
+        for i in range(n_frames):
+            writer.write_frame(np.full((64, 64, 3), (i * 37) % 256, dtype=np.uint8))
+    finally:
+        writer.close()
+
+    keyframes = [round(t * fps) for t in probe_keyframes(path)]
+    assert keyframes == list(range(0, n_frames, gop))
@@ -0,0 +1,31 @@
+"""
+Caption layout of subtitles.subtitles
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from subtitles import clear_caches
+from subtitles.raster import render_text
+from subtitles.subtitles import calculate_lines
+
+
+FONT = os.path.join(ROOT, "subtitles", "fonts", "Bangers-Regular.ttf")
+
+@pytest.mark.parametrize("stroke_width", [0, 8])
+def test_line_height_matches_rendered_text(stroke_width):
+    clear_caches()
+    data = calculate_lines("Octopuses have THREE hearts! Two pump blood to the gills", FONT, 130, stroke_width, 980)
+    assert len(data["lines"]) > 1
+
+    for line in data["lines"]:
+        rendered = render_text(line["text"], 130, "white", FONT, stroke_color="black", stroke_width=stroke_width)
+        assert line["height"] == rendered.shape[0]
+        assert rendered.shape[1] < 980
+    assert data["height"] == sum(line["height"] for line in data["lines"])
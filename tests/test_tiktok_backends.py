@@ -0,0 +1,50 @@
+"""
+Parity of create_tiktok's moviepy and ffmpeg backends on landscape and portrait footage
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fixtures
+
+from moviepy.editor import VideoFileClip
+from ft_utils import create_tiktok
+
+
+MAX_MEAN_PIXEL_DIFF = 4.0  # resampling and encoding noise, a misplaced crop is far above
+
+@pytest.fixture(scope="module")
+def audio(tmp_path_factory):
+    root = tmp_path_factory.mktemp("audio")
+    voiceover = str(root / "voiceover.mp3")
+    fixtures.ffmpeg("-f", "lavfi", "-i", "sine=f=440", "-t", "1", voiceover)
+    return voiceover, fixtures.make_music(str(root / "music.mp3"), duration=3)
+
+@pytest.mark.parametrize("size", ["1920x1080", "720x1600", "640x1280"])
+def test_backends_render_the_same_frame(size, audio, tmp_path):
+    voiceover, music = audio
+    gameplay = fixtures.make_gameplay(str(tmp_path / "gameplay.mp4"), duration=2, size=size)
+
+    outputs = {}
+    for backend in ["moviepy", "ffmpeg"]:
+        outputs[backend] = str(tmp_path / f"{backend}.mp4")
+        create_tiktok(gameplay, voiceover, music, output_path=outputs[backend], backend=backend, music_start=0.0)
+
+    reference, output = VideoFileClip(outputs["moviepy"]), VideoFileClip(outputs["ffmpeg"])
+    try:
+        assert reference.size == output.size == [1080, 1920]
+        diff = np.mean([
+            np.abs(reference.get_frame(t).astype(int) - output.get_frame(t).astype(int)).mean()
+            for t in (0.2, 0.5, 0.8)
+        ])
+        assert diff < MAX_MEAN_PIXEL_DIFF
+    finally:
+        reference.close()
+        output.close()